@@ -1,7 +1,6 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from pyaxis import pyaxis
 import datetime
 import numpy as np
 from PIL import Image
@@ -9,11 +8,26 @@ import calendar
 from streamlit import config
 import requests
 from io import BytesIO
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import datetime
 import calendar
 import pandas as pd
 import plotly.graph_objs as go
-
+import plotly.io as pio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from dataclasses import dataclass, field
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
 
 # Set the page width m #
 st.set_page_config(page_title='Swiss Hospitality Explorer (Beta)',page_icon= "🇨🇭",initial_sidebar_state="auto")
@@ -421,124 +435,1562 @@ country_mapping = {
 }
 
 # Constants
-COUNTRY_URL = "https://www.pxweb.bfs.admin.ch/DownloadFile.aspx?file=px-x-1003020000_101"
-SUPPLY_URL = "https://www.pxweb.bfs.admin.ch/DownloadFile.aspx?file=px-x-1003020000_201"
-KANTON_URL = "https://www.pxweb.bfs.admin.ch/DownloadFile.aspx?file=px-x-1003020000_102"
+BFS_BASE_URL = os.environ.get("BFS_BASE_URL", "https://www.pxweb.bfs.admin.ch")  # point to a local stand-in for testing
+COUNTRY_URL = f"{BFS_BASE_URL}/DownloadFile.aspx?file=px-x-1003020000_101"
+SUPPLY_URL = f"{BFS_BASE_URL}/DownloadFile.aspx?file=px-x-1003020000_201"
+KANTON_URL = f"{BFS_BASE_URL}/DownloadFile.aspx?file=px-x-1003020000_102"
 MONTH_MAPPING = {
     'Januar': '1', 'Februar': '2', 'März': '3', 'April': '4', 'Mai': '5', 'Juni': '6',
     'Juli': '7', 'August': '8', 'September': '9', 'Oktober': '10', 'November': '11', 'Dezember': '12'
 }
+# Total members BFS publishes next to the detail members
+JAHRESTOTAL = "Jahrestotal"  # Monat
+ALL_ORIGINS = "Herkunftsland - Total"  # Herkunftsland
+NATIONAL = "Schweiz"  # Kanton
+
+# Local snapshot of the cleaned datasets, survives restarts and redeploys
+SNAPSHOT_DIR = Path(os.environ.get("SNAPSHOT_DIR", "data/snapshot"))
+SNAPSHOT_TTL = datetime.timedelta(hours=float(os.environ.get("SNAPSHOT_TTL_HOURS", "24")))
+SNAPSHOT_VERSION = 5  # bump when the layout of the prepared frames changes
+PX_ENCODING = 'ISO-8859-2'
+PX_CHUNK_SIZE = 1 << 20  # bytes of the DATA section converted per step
+# Dimensions kept as pandas categoricals: filters and groupbys work on integer codes
+CATEGORY_COLUMNS = ["Gemeinde", "Kanton", "Herkunftsland", "Monat"]
+DOWNLOAD_TIMEOUT = 120  # seconds, hard limit for a whole download
+DOWNLOAD_CONNECT_TIMEOUT = 10  # seconds
+DOWNLOAD_READ_TIMEOUT = 30  # seconds without receiving any byte
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_BACKOFF = 1.0  # seconds, doubled after every retry
+INCREMENTAL_MAX_SLICES = 24  # more changed (Jahr, Monat) slices than this are rebuilt in full
+LOAD_TIMEOUT = 300  # seconds per dataset, download and preparation
+REFRESH_RETRY = datetime.timedelta(minutes=10)  # wait before retrying a failed refresh
+# BFS publishes the new month early in the month, inside this window upstream is checked more often
+PUBLICATION_FIRST_DAY, PUBLICATION_LAST_DAY = (int(day) for day in os.environ.get("BFS_PUBLICATION_DAYS", "6-10").split("-"))
+PUBLICATION_DAYS = range(PUBLICATION_FIRST_DAY, PUBLICATION_LAST_DAY + 1)
+PUBLICATION_CHECK = datetime.timedelta(hours=1)
+WARMER_INTERVAL = 60  # seconds between two runs of the background warmer
+AGGREGATE_CACHE_SIZE = 256  # entries
+FIGURE_CACHE_MB = int(os.environ.get("FIGURE_CACHE_MB", "64"))  # serialized size of the cached figures
+FIGURE_CACHE_DIR = os.environ.get("FIGURE_CACHE_DIR")  # unset keeps the figures in memory only
+FIGURE_CACHE_VERSION = 2  # bump when the figures the pages build change
+CHART_RENDER_MODE = frozenset(filter(None, os.environ.get("CHART_RENDER_MODE", "binary").split(",")))  # see Figure factory
+CHART_MAX_POINTS = int(os.environ.get("CHART_MAX_POINTS", "120"))  # per series with the downsample render mode
+DEFAULT_START_YEAR = 2018  # preselected start of the Zeitraum slider
 
 
 # Helper functions 
 
-def download_data(url: str) -> pd.DataFrame:
-    px_data = pyaxis.parse(uri=url, encoding='ISO-8859-2')
-    return px_data['DATA']
+# PX-Axis reader
+# A PX file is a dense cube: STUB and HEADING name the dimensions, VALUES("<dim>") their members
+# and DATA holds the cells in row-major order. The cells are read straight into a float array,
+# BFS placeholders like "..." or "." become NaN.
+
+@dataclass
+class PxCube:
+    dims: list[str]
+    values: list[list[str]]
+    data: np.ndarray
+
+    def drop(self, dim: str, members: list[str]) -> "PxCube":
+        axis = self.dims.index(dim)
+        keep = [i for i, member in enumerate(self.values[axis]) if member not in members]
+        values = list(self.values)
+        values[axis] = [self.values[axis][i] for i in keep]
+        return PxCube(self.dims, values, np.take(self.data, keep, axis=axis))
+
+    def select(self, dim: str, members: list[str]) -> "PxCube":
+        return self.drop(dim, [member for member in self.values[self.dims.index(dim)] if member not in members])
+
+# Members are separated by commas, quoted strings next to each other without a comma are one string
+# written over several lines
+def parse_px_metadata(text: str) -> dict[str, list[str]]:
+    metadata = {}
+    for statement in re.findall(r'((?:[^;"]|"[^"]*")+);', text):
+        key, _, value = statement.partition("=")
+        key = re.sub(r'\s*([()])\s*', r'\1', key.strip())
+        metadata[key] = ["".join(re.findall(r'"([^"]*)"', item)).strip()
+                         for item in re.findall(r'(?:[^,"]|"[^"]*")+', value) if '"' in item]
+    return metadata
+
+def read_px(raw: bytes, encoding: str = PX_ENCODING) -> PxCube:
+    match = re.search(rb'(?:^|;)\s*DATA\s*=', raw)
+    if match is None:
+        raise ValueError("PX file without DATA section")
+    metadata = parse_px_metadata(raw[:match.start() + 1].decode(encoding))
+    dims = metadata["STUB"] + metadata.get("HEADING", [])
+    values = [metadata[f'VALUES("{dim}")'] for dim in dims]
+    shape = tuple(len(members) for members in values)
+
+    body = re.sub(rb'"[^"]*"', b"nan", raw[match.end():].replace(b";", b" "))
+    data = np.empty(int(np.prod(shape)), dtype=np.float64)
+    filled, start = 0, 0
+    while start < len(body):
+        # cut chunks at whitespace so no number is split in two
+        end = min(start + PX_CHUNK_SIZE, len(body))
+        while end < len(body) and not body[end:end + 1].isspace():
+            end += 1
+        cells = np.array(body[start:end].split(), dtype=np.float64)
+        if filled + len(cells) > len(data):
+            raise ValueError(f"PX DATA has more cells than the {len(data)} described by its metadata")
+        data[filled:filled + len(cells)] = cells
+        filled += len(cells)
+        start = end
+    if filled != len(data):
+        raise ValueError(f"PX DATA has {filled} cells, expected {len(data)}")
+
+    return PxCube(dims, values, data.reshape(shape))
+
+def cube_to_frame(cube: PxCube, column_dim: str) -> pd.DataFrame:
+    # One row per combination of the other dimensions, one column per member of column_dim
+    axis = cube.dims.index(column_dim)
+    data = np.moveaxis(cube.data, axis, -1)
+    shape = data.shape[:-1]
+    rows = int(np.prod(shape))
+
+    frame = {}
+    inner = rows
+    for dim, members, size in zip([d for d in cube.dims if d != column_dim],
+                                  [v for d, v in zip(cube.dims, cube.values) if d != column_dim],
+                                  shape):
+        inner //= size
+        codes = np.tile(np.repeat(np.arange(size), inner), rows // (size * inner))
+        if dim == "Monat":
+            # ordered in calendar order, so sorting and comparisons follow the year, Jahrestotal comes last
+            months = list(MONTH_MAPPING) + [member for member in members if member not in MONTH_MAPPING]
+            frame[dim] = pd.Categorical.from_codes(codes, categories=members).set_categories(months, ordered=True)
+        elif dim in CATEGORY_COLUMNS:
+            frame[dim] = pd.Categorical.from_codes(codes, categories=members)
+        else:
+            frame[dim] = np.asarray(members, dtype=object)[codes]
+    cells = data.reshape(rows, -1)
+    for i, member in enumerate(cube.values[axis]):
+        frame[member] = cells[:, i]
+    return pd.DataFrame(frame)
 
-def download_data_utf8(url: str) -> pd.DataFrame:
-    px_data = pyaxis.parse(uri=url, encoding='utf-8')
-    return px_data['DATA']
+def convert_to_datetime(df: pd.DataFrame) -> pd.DataFrame:
 
+    # Map 'Monat' to its month number, unknown names would silently become NaT otherwise
+    month = df['Monat'].map({name: int(number) for name, number in MONTH_MAPPING.items()})
+    if month.isna().any():
+        raise ValueError(f"Unknown months found: {df.loc[month.isna(), 'Monat'].unique()}")
 
-def filter_data(df: pd.DataFrame) -> pd.DataFrame:
-    df = df[(df["Monat"] != "Jahrestotal")]
-    return df
-
-def pivot_data(df: pd.DataFrame, index_columns: list[str], columns: str, values: str) -> pd.DataFrame:
-    df = df.pivot(index=index_columns, columns=columns, values=values).reset_index()
-    return df
+    # Months since 1970-01 as a native datetime64 column, no string parsing
+    months_since_epoch = (df['Jahr'].astype(int).to_numpy() - 1970) * 12 + np.asarray(month, dtype=int) - 1
+    df['Date'] = months_since_epoch.astype('datetime64[M]').astype('datetime64[ns]')
 
-def convert_to_datetime(df: pd.DataFrame) -> pd.DataFrame:
-    
-    # Ensure 'Jahr' is in integer format and then convert to string
-    df['Year'] = df['Jahr'].astype(int).astype(str)
-    
-    # Map 'Monat' to its corresponding integer value
-    df['Month'] = df['Monat'].map(MONTH_MAPPING).astype(int).astype(str)
-    
-    # Create a combined 'Date' string
-    df['Date_str'] = df['Year'] + '-' + df['Month']
-    
-    # Check if there are any problematic date strings before conversion
-    problematic_dates = df[~df['Date_str'].str.match(r'^\d{4}-\d{1,2}$')]
-    if not problematic_dates.empty:
-        raise ValueError(f"Problematic date strings found: {problematic_dates['Date_str'].values}")
-    
-    # Convert 'Date_str' to datetime
-    df['Date'] = pd.to_datetime(df['Date_str'])
-    df['Date'] = df['Date'].dt.date
-    
     # Rearrange columns and sort by date
-    df = df[['Date'] + df.columns[:-3].tolist()]
-    df = df.sort_values('Date').reset_index(drop=True)
-    
-    return df
+    df = df[['Date'] + df.columns[:-1].tolist()]
+    df = df.sort_values('Date', kind='stable').reset_index(drop=True)
 
-def convert_columns(df: pd.DataFrame, numeric_columns: list[str]) -> pd.DataFrame:
-    for column in numeric_columns:
-        df[column] = pd.to_numeric(df[column], errors='coerce')
     return df
 
 def calculate_additional_columns(df: pd.DataFrame, numerator: str, denominator: str, result_column: str) -> pd.DataFrame:
     df[result_column] = df[numerator] / df[denominator]
     return df
 
+def domestic_international(herkunftsland) -> pd.Categorical:
+    domestic = np.asarray(herkunftsland == "Schweiz")
+    return pd.Categorical.from_codes(np.where(domestic, 0, 1), categories=["Domestic", "International"])
+
 def map_herkunftsland(df: pd.DataFrame, herkunftsland_column: str, result_column: str) -> pd.DataFrame:
-    df[result_column] = df[herkunftsland_column].apply(lambda x: "Domestic" if x == "Schweiz" else "International")
+    df[result_column] = domestic_international(df[herkunftsland_column])
+    return df
+
+# Validation and cleaning in one pass of column masks.
+# Rows are attributed to the first reason they fail, the counts form the rejection report.
+def clean_data(df: pd.DataFrame, indicator_columns: list[str], required_columns: list[str]) -> tuple[pd.DataFrame, dict[str, int]]:
+    keep = df[indicator_columns].notna().any(axis=1).to_numpy()
+    rejected = {"not published": int((~keep).sum())}
+    for column in required_columns:
+        missing = keep & df[column].isna().to_numpy()
+        rejected[f"{column} missing"] = int(missing.sum())
+        keep &= ~missing
+    return df[keep], rejected
+
+
+# Ingest pipeline
+# Every dataset runs the same stages: fetch, parse, pivot, dates, clean, enrich.
+# Fetch is revalidated with the upstream validators, parse is keyed by the sha256 of the download and
+# the later stages by the hash of the parsed cells (see cube_key), chained with the stage names. Stage
+# outputs are only kept until a run completes, so a run that failed halfway resumes at the stage that
+# failed. Across refreshes the snapshot is the one output kept: a download whose cells match it skips
+# the later stages, otherwise only the changed slices run them (see Incremental refresh).
+
+@dataclass
+class DatasetSpec:
+    url: str
+    drop: dict[str, list[str]]  # cube members removed before pivoting
+    totals: dict[str, str]  # total member per dimension, kept as official totals, see split_totals
+    enrich: bool  # add Aufenthaltsdauer and Herkunftsland_grob
+    ttl: datetime.timedelta  # refresh schedule of this dataset
+
+def dataset_ttl(name: str) -> datetime.timedelta:
+    hours = os.environ.get(f"SNAPSHOT_TTL_HOURS_{name.upper()}")
+    return datetime.timedelta(hours=float(hours)) if hours else SNAPSHOT_TTL
+
+def stage_parse(spec: DatasetSpec, raw: bytes) -> PxCube:
+    cube = read_px(raw)
+    for dim, members in spec.drop.items():
+        cube = cube.drop(dim, members)
+    return cube
+
+def stage_pivot(spec: DatasetSpec, cube: PxCube) -> pd.DataFrame:
+    return cube_to_frame(cube, "Indikator")
+
+def stage_dates(spec: DatasetSpec, df: pd.DataFrame) -> pd.DataFrame:
+    return convert_to_datetime(df)
+
+def stage_clean(spec: DatasetSpec, df: pd.DataFrame) -> pd.DataFrame:
+    indicator_columns = [column for column in df.columns if column not in ("Date", "Jahr", *CATEGORY_COLUMNS)]
+    # cast before filtering, assigning to the filtered rows would write to a slice of the input
+    df['Jahr'] = df['Jahr'].astype(int)
+    df, rejected = clean_data(df, indicator_columns, ["Ankünfte", "Logiernächte"]) #filter out not avaiable data
+    df.attrs["rejected"] = rejected
     return df
 
-# Check if a value is numeric
-def is_numeric(value):
+def stage_enrich(spec: DatasetSpec, df: pd.DataFrame) -> pd.DataFrame:
+    if spec.enrich:
+        df = calculate_additional_columns(df, "Logiernächte", "Ankünfte", "Aufenthaltsdauer")
+        df = map_herkunftsland(df, "Herkunftsland", "Herkunftsland_grob")
+    return df
+
+# Kanton and Wappen of every row for the page headers, rows ordered for row_ranges
+def stage_index(spec: DatasetSpec, df: pd.DataFrame) -> pd.DataFrame:
+    if "Gemeinde" in df.columns:
+        df["Kanton"] = df["Gemeinde"].map(gemeinde_kanton_mapping).astype("category")
+        df["Gemeindewappen"] = df["Gemeinde"].map(gemeindewappen).astype("category")
+    df["Kantonswappen"] = df["Kanton"].map(kantonswappen).astype("category")
+    return sort_rows(df)
+
+PIPELINE_STAGES = [
+    ("parse", stage_parse),
+    ("pivot", stage_pivot),
+    ("dates", stage_dates),
+    ("clean", stage_clean),
+    ("enrich", stage_enrich),
+    ("index", stage_index),
+]
+
+# Rows are ordered by Gemeinde (or Kanton) and Date, the rows of one region are a contiguous range
+def sort_rows(df: pd.DataFrame) -> pd.DataFrame:
+    region = "Gemeinde" if "Gemeinde" in df.columns else "Kanton"
+    return df.sort_values([region, "Date"], kind="stable").reset_index(drop=True)
+
+# Row range of every member of column, df must be ordered by column as sort_rows does
+def row_ranges(df: pd.DataFrame, column: str) -> dict[str, slice]:
+    codes = df[column].cat.codes.to_numpy()
+    if (np.diff(codes) < 0).any():
+        raise ValueError(f"Rows are not ordered by {column}")
+    categories = df[column].cat.categories
+    bounds = np.searchsorted(codes, np.arange(len(categories) + 1))
+    return {member: slice(bounds[i], bounds[i + 1]) for i, member in enumerate(categories) if bounds[i] < bounds[i + 1]}
+
+# Runs the given stages on value, key identifies value. Returns the output and its key.
+def run_pipeline(name: str, spec: DatasetSpec, value, key: str, stage_cache: dict, stages: list = PIPELINE_STAGES) -> tuple:
+    for stage_name, stage in stages:
+        key = hashlib.sha256(f"{key}/{stage_name}".encode()).hexdigest()
+        cached_key, cached_value = stage_cache.get(stage_name, (None, None))
+        if cached_key == key:
+            logger.info("Dataset %s: stage %s unchanged, reusing its output", name, stage_name)
+            value = cached_value
+            continue
+        # Stages add columns to their input, a shallow copy keeps the cached output intact
+        if isinstance(value, pd.DataFrame):
+            value = value.copy(deep=False)
+        value = stage(spec, value)
+        stage_cache[stage_name] = (key, value)
+    return value, key
+
+
+# Incremental refresh
+# BFS publishes one month at a time and now and then revises recent months. The manifest keeps a hash
+# per (Jahr, Monat) slice of the parsed cube, a refresh only runs the later stages on the slices whose
+# hash changed and merges their rows into the stored frame. The rows that differ form the change set.
+
+def slice_hashes(cube: PxCube) -> dict[str, str]:
+    jahr_axis, monat_axis = cube.dims.index("Jahr"), cube.dims.index("Monat")
+    data = np.moveaxis(cube.data, (jahr_axis, monat_axis), (0, 1))
+    # the members of the other dimensions belong to every slice, a new Gemeinde changes all of them
+    members = json.dumps([[dim, members] for dim, members in zip(cube.dims, cube.values) if dim not in ("Jahr", "Monat")]).encode()
+    hashes = {}
+    for i, jahr in enumerate(cube.values[jahr_axis]):
+        for j, monat in enumerate(cube.values[monat_axis]):
+            digest = hashlib.blake2b(members, digest_size=16)
+            digest.update(np.ascontiguousarray(data[i, j]).tobytes())
+            hashes[f"{jahr}/{monat}"] = digest.hexdigest()
+    return hashes
+
+# Hash of the parsed cube: its slices and its official totals. The stages after parse are keyed by it, so a
+# new download with the same cells (a re-export with a new timestamp) is recognized as unchanged.
+def cube_key(hashes: dict[str, str], totals: pd.DataFrame) -> str:
+    digest = hashlib.sha256(json.dumps(hashes).encode())
+    digest.update(pd.util.hash_pandas_object(totals, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def slice_mask(df: pd.DataFrame, slices: list[str]) -> np.ndarray:
+    mask = np.zeros(len(df), dtype=bool)
+    jahr = df['Jahr'].to_numpy()
+    for key in slices:
+        year, month = key.split("/")
+        mask |= (jahr == int(year)) & (df['Monat'] == month).to_numpy()
+    return mask
+
+def diff_slices(old: pd.DataFrame, new: pd.DataFrame) -> dict[str, list[str]]:
+    # old and new cover the same slices, every row that was added, removed or altered names its members
+    members = [column for column in ("Gemeinde", "Kanton", "Herkunftsland") if column in new.columns]
+    keys = ["Jahr", "Monat"] + members
+    values = [column for column in new.select_dtypes("number").columns if column in old.columns and column not in keys]
+    as_object = {column: object for column in keys if column != "Jahr"}
+    merged = old[keys + values].astype(as_object).merge(new[keys + values].astype(as_object), on=keys, how="outer", suffixes=("_old", ""), indicator=True)
+    changed = (merged["_merge"] != "both").to_numpy()
+    for column in values:
+        before, after = merged[f"{column}_old"].to_numpy(), merged[column].to_numpy()
+        changed |= ~((before == after) | (np.isnan(before) & np.isnan(after)))
+    return {column: sorted(merged.loc[changed, column].dropna().unique().tolist()) for column in members}
+
+def concat_slices(old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    # categoricals only survive concat with identical categories, members missing from new are appended
+    dtypes = {}
+    for column in new.select_dtypes("category").columns:
+        if old[column].dtype != new[column].dtype:
+            categories = new[column].cat.categories
+            categories = categories.append(old[column].cat.categories.difference(categories))
+            dtypes[column] = pd.CategoricalDtype(categories, ordered=new[column].cat.ordered)
+    return sort_rows(pd.concat([old.astype(dtypes), new.astype(dtypes)], ignore_index=True))
+
+def merge_slices(name: str, spec: DatasetSpec, cube: PxCube, key: str, changed: list[str], removed: list[str],
+                 old: pd.DataFrame, stage_cache: dict) -> tuple[pd.DataFrame, dict]:
+    changes = {"slices": changed + removed}
+    if not changed and not removed:
+        return old, dict(changes, **{column: [] for column in ("Gemeinde", "Kanton", "Herkunftsland") if column in old.columns})
+
+    # Bounding box of the changed slices, unchanged slices inside it come back identical
+    years = sorted({slice_key.split("/")[0] for slice_key in changed})
+    months = sorted({slice_key.split("/")[1] for slice_key in changed})
+    replaced = [f"{year}/{month}" for year in years for month in months] + removed
+    key = hashlib.sha256(f"{key}/{','.join(replaced)}".encode()).hexdigest()
+    if changed:
+        new, _ = run_pipeline(name, spec, cube.select("Jahr", years).select("Monat", months), key, stage_cache, PIPELINE_STAGES[1:])
+        rejected = new.attrs.pop("rejected", {})
+    else:
+        # only removed slices, their rows are dropped and nothing is processed
+        new, rejected = old.iloc[:0], {}
+
+    mask = slice_mask(old, replaced)
+    changes.update(diff_slices(old[mask], new))
+    df = concat_slices(old[~mask], new)
+    df.attrs["rejected"] = rejected
+    return df, changes
+
+
+# Official totals
+# BFS publishes the sums over some dimensions as members of their own: the Jahrestotal of every year,
+# Herkunftsland - Total and the Kanton Schweiz. They are split off after parsing, the frames only hold
+# the detail members, and kept as a long frame of their own with one row per cell where at least one
+# dimension is at its total member. Date is NaT for the Jahrestotal rows. check_totals compares them
+# with the sums over the frame on every refresh.
+
+def split_totals(spec: DatasetSpec, cube: PxCube) -> tuple[PxCube, pd.DataFrame]:
+    categories = dict(zip(cube.dims, cube.values))
+    pieces = []
+    for dim, member in spec.totals.items():
+        if member not in cube.values[cube.dims.index(dim)]:
+            raise ValueError(f"Total {member!r} missing from {dim}")
+        pieces.append(cube_to_frame(cube.select(dim, [member]), "Indikator"))
+        cube = cube.drop(dim, [member])
+
+    totals = pd.concat(pieces, ignore_index=True)
+    for dim, members in categories.items():
+        if dim == "Monat":
+            totals[dim] = pd.Categorical(totals[dim], categories=list(MONTH_MAPPING) + [JAHRESTOTAL], ordered=True)
+        elif dim in CATEGORY_COLUMNS:
+            totals[dim] = pd.Categorical(totals[dim], categories=members)
+    totals['Jahr'] = totals['Jahr'].astype(int)
+    month = totals['Monat'].cat.codes.to_numpy()
+    dates = ((totals['Jahr'].to_numpy() - 1970) * 12 + month).astype('datetime64[M]').astype('datetime64[ns]')
+    totals.insert(0, 'Date', np.where(month < len(MONTH_MAPPING), dates, np.datetime64('NaT')))
+
+    # a month without any published detail cell is not published yet, whatever its totals say
+    jahr_axis, monat_axis = cube.dims.index("Jahr"), cube.dims.index("Monat")
+    data = np.moveaxis(cube.data, (jahr_axis, monat_axis), (0, 1))
+    published = ~np.isnan(data.reshape(data.shape[:2] + (-1,))).all(axis=2)
+    published_dates = [np.datetime64(f"{jahr}-{int(MONTH_MAPPING[monat]):02d}", 'ns')
+                       for i, jahr in enumerate(cube.values[jahr_axis])
+                       for j, monat in enumerate(cube.values[monat_axis]) if published[i, j]]
+    indicator_columns = [column for column in totals.columns if column not in ("Date", "Jahr", *CATEGORY_COLUMNS)]
+    keep = totals[indicator_columns].notna().any(axis=1) & (totals['Date'].isna() | totals['Date'].isin(published_dates))
+    totals = totals[keep].reset_index(drop=True)
+    if spec.enrich:
+        totals = calculate_additional_columns(totals, "Logiernächte", "Ankünfte", "Aufenthaltsdauer")
+    return cube, totals
+
+# Per kind of total (the dimensions at their total member): cells compared with the sum over the frame
+# and cells that differ. Only the additive indicators are compared, cells missing on one side are skipped.
+def check_totals(spec: DatasetSpec, df: pd.DataFrame, totals: pd.DataFrame) -> dict[str, dict]:
+    indicators = [measure for measure, how in MEASURES.items() if how == 'sum' and measure in totals.columns]
+    at_total = np.stack([(totals[dim] == member).to_numpy() for dim, member in spec.totals.items()], axis=1)
+    report = {}
+    for kind in np.unique(at_total, axis=0):
+        dims = [dim for dim, is_total in zip(spec.totals, kind) if is_total]
+        keys = [column for column in ("Jahr", "Monat", "Gemeinde", "Kanton", "Herkunftsland") if column in totals.columns and column not in dims]
+        as_object = {column: object for column in keys if column != "Jahr"}
+        official = totals.loc[(at_total == kind).all(axis=1), keys + indicators].astype(as_object)
+        own = df.groupby(keys, observed=True)[indicators].sum(min_count=1).reset_index().astype(as_object)
+        merged = official.merge(own, on=keys, suffixes=("", "_own"))
+        expected = merged[indicators].to_numpy(dtype=np.float64)
+        difference = np.abs(expected - merged[[f"{indicator}_own" for indicator in indicators]].to_numpy(dtype=np.float64))
+        compared = ~np.isnan(difference)
+        report[" + ".join(spec.totals[dim] for dim in dims)] = {
+            "cells": int(compared.sum()),
+            "mismatches": int((difference[compared] > 0.5).sum()),
+            "max_difference": float(difference[compared].max(initial=0)),
+        }
+    return report
+
+
+# Snapshot handling
+# Every dataset is stored as <name>.parquet in SNAPSHOT_DIR, its official totals as <name>.totals.parquet.
+# manifest.json keeps the sha256 of the raw download and the fetch time per dataset.
+
+class DataLoadError(RuntimeError):
+    pass
+
+def read_manifest() -> dict:
+    manifest_path = SNAPSHOT_DIR / "manifest.json"
+    if not manifest_path.exists():
+        return {}
     try:
-        int(value)
-        return True
-    except ValueError:
-        return False
+        return json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        logger.warning("Snapshot manifest unreadable, ignoring it")
+        return {}
+
+def write_manifest(manifest: dict) -> None:
+    tmp_path = SNAPSHOT_DIR / "manifest.json.tmp"
+    tmp_path.write_text(json.dumps(manifest, indent=2, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, SNAPSHOT_DIR / "manifest.json")
+
+# The datasets load in parallel, so read-modify-write of the manifest is serialized
+def update_manifest(name: str, entry: dict, lock: threading.Lock) -> None:
+    with lock:
+        manifest = read_manifest()
+        manifest[name] = entry
+        write_manifest(manifest)
+
+
+# Fetch layer
+# One pooled session per process with gzip, bounded retries with backoff and conditional requests.
+# An unchanged cube answers with 304 and costs a single round trip.
+
+@dataclass
+class FetchResult:
+    raw: bytes | None  # None when the server answered 304 Not Modified
+    etag: str | None
+    last_modified: str | None
+    sha256: str | None
+
+@st.cache_resource
+def http_session() -> requests.Session:
+    retry = Retry(
+        total=DOWNLOAD_RETRIES,
+        backoff_factor=DOWNLOAD_BACKOFF,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=len(DATASETS), pool_maxsize=len(DATASETS))
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    return session
+
+@st.cache_resource
+def manifest_lock() -> threading.Lock:
+    return threading.Lock()
+
+def fetch_raw(session: requests.Session, url: str, etag: str | None = None, last_modified: str | None = None) -> FetchResult:
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    deadline = time.monotonic() + DOWNLOAD_TIMEOUT
+    with session.get(url, headers=headers, stream=True, timeout=(DOWNLOAD_CONNECT_TIMEOUT, DOWNLOAD_READ_TIMEOUT)) as response:
+        if response.status_code == 304:
+            return FetchResult(None, response.headers.get("ETag", etag), response.headers.get("Last-Modified", last_modified), None)
+        response.raise_for_status()
+        chunks = []
+        for chunk in response.iter_content(chunk_size=1 << 16):  # already gunzipped
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Download of {url} took longer than {DOWNLOAD_TIMEOUT}s")
+            chunks.append(chunk)
+        raw = b"".join(chunks)
+        return FetchResult(raw, response.headers.get("ETag"), response.headers.get("Last-Modified"), hashlib.sha256(raw).hexdigest())
+
+def next_refresh(fetched_at: datetime.datetime, ttl: datetime.timedelta) -> datetime.datetime:
+    due = fetched_at + ttl
+    # Inside the publication window upstream is checked every PUBLICATION_CHECK
+    if fetched_at.day in PUBLICATION_DAYS:
+        return min(due, fetched_at + PUBLICATION_CHECK)
+    # and a long TTL never sleeps past the start of the next window
+    window = fetched_at.replace(day=PUBLICATION_DAYS.start, hour=0, minute=0, second=0, microsecond=0)
+    if window <= fetched_at:
+        window = (window + datetime.timedelta(days=32)).replace(day=PUBLICATION_DAYS.start)
+    return min(due, window)
+
+def snapshot_is_fresh(entry: dict, ttl: datetime.timedelta) -> bool:
+    fetched_at = datetime.datetime.fromisoformat(entry["fetched_at"])
+    return datetime.datetime.now(datetime.timezone.utc) < next_refresh(fetched_at, ttl)
+
+def snapshot_paths(name: str) -> tuple[Path, Path]:
+    return SNAPSHOT_DIR / f"{name}.parquet", SNAPSHOT_DIR / f"{name}.totals.parquet"
+
+def has_snapshot(name: str, entry: dict | None) -> bool:
+    return entry is not None and entry.get("version") == SNAPSHOT_VERSION and all(path.exists() for path in snapshot_paths(name))
+
+# Last snapshot on disk regardless of its age: the frame, its official totals, the time it was fetched and
+# the sha256 of the raw download
+def read_snapshot(name: str) -> tuple[pd.DataFrame, pd.DataFrame, datetime.datetime, str] | None:
+    entry = read_manifest().get(name)
+    if not has_snapshot(name, entry):
+        return None
+    parquet_path, totals_path = snapshot_paths(name)
+    return (pd.read_parquet(parquet_path), pd.read_parquet(totals_path), datetime.datetime.fromisoformat(entry["fetched_at"]),
+            entry["sha256"])
+
+# Returns the frame, its official totals, when it was fetched and the change set of this refresh
+# (None if nothing was reprocessed)
+def load_snapshot(name: str, spec: DatasetSpec, session: requests.Session, lock: threading.Lock,
+                  stage_cache: dict) -> tuple[pd.DataFrame, pd.DataFrame, datetime.datetime, dict | None]:
+    SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+    manifest = read_manifest()
+    entry = manifest.get(name)
+    parquet_path, totals_path = snapshot_paths(name)
+    have_snapshot = has_snapshot(name, entry)
+
+    # Snapshot younger than the TTL: no network at all
+    if have_snapshot and snapshot_is_fresh(entry, spec.ttl):
+        return pd.read_parquet(parquet_path), pd.read_parquet(totals_path), datetime.datetime.fromisoformat(entry["fetched_at"]), None
+
+    if have_snapshot:
+        result = fetch_raw(session, spec.url, entry.get("etag"), entry.get("last_modified"))
+    else:
+        result = fetch_raw(session, spec.url)
+    fetched_at = datetime.datetime.now(datetime.timezone.utc)
+
+    # Upstream unchanged (304, or same bytes from a server ignoring the validators):
+    # keep the snapshot, only renew the fetch timestamp and validators
+    if have_snapshot and (result.raw is None or entry["sha256"] == result.sha256):
+        update_manifest(name, dict(entry, fetched_at=fetched_at.isoformat(), etag=result.etag, last_modified=result.last_modified), lock)
+        logger.info("Dataset %s unchanged upstream", name)
+        return pd.read_parquet(parquet_path), pd.read_parquet(totals_path), fetched_at, None
+    if result.raw is None:
+        raise DataLoadError(f"{name}: 304 Not Modified without a local snapshot")
+
+    cube, _ = run_pipeline(name, spec, result.raw, result.sha256, stage_cache, PIPELINE_STAGES[:1])
+    cube, totals = split_totals(spec, cube)
+    hashes = slice_hashes(cube)
+    key = cube_key(hashes, totals)
+    # New bytes, same cells: keep the snapshot and its frame, only the later stages would have run
+    if have_snapshot and entry.get("cube") == key:
+        stage_cache.clear()
+        update_manifest(name, dict(entry, sha256=result.sha256, fetched_at=fetched_at.isoformat(), etag=result.etag,
+                                   last_modified=result.last_modified), lock)
+        logger.info("Dataset %s: new download with unchanged cells", name)
+        return pd.read_parquet(parquet_path), pd.read_parquet(totals_path), fetched_at, None
+    if have_snapshot and "slices" in entry:
+        changed = [slice_key for slice_key, digest in hashes.items() if entry["slices"].get(slice_key) != digest]
+        removed = [slice_key for slice_key in entry["slices"] if slice_key not in hashes]
+    incremental = have_snapshot and "slices" in entry and len(changed) + len(removed) <= INCREMENTAL_MAX_SLICES
+    if incremental:
+        df, changes = merge_slices(name, spec, cube, key, changed, removed, pd.read_parquet(parquet_path), stage_cache)
+    else:
+        df, _ = run_pipeline(name, spec, cube, key, stage_cache, PIPELINE_STAGES[1:])
+        changes = {"full": True}
+    stage_cache.clear()
+    rejected = df.attrs.pop("rejected", {})
+    logger.info("Dataset %s: rows rejected while cleaning %s", name, rejected)
+    logger.info("Dataset %s: %s refresh, changes %s", name, "incremental" if incremental else "full", changes)
+    totals_check = check_totals(spec, df, totals)
+    if any(result["mismatches"] for result in totals_check.values()):
+        logger.warning("Dataset %s: official totals differ from the sums over the frame %s", name, totals_check)
+
+    for frame, path in [(df, parquet_path), (totals, totals_path)]:
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        frame.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    update_manifest(name, {
+        "url": spec.url,
+        "sha256": result.sha256,
+        "etag": result.etag,
+        "last_modified": result.last_modified,
+        "fetched_at": fetched_at.isoformat(),
+        "rows": len(df),
+        "totals_rows": len(totals),
+        "totals_check": totals_check,
+        "rejected": rejected,  # rows processed by this refresh only
+        "refresh": "incremental" if incremental else "full",
+        "changes": changes,
+        "slices": hashes,
+        "cube": key,
+        "version": SNAPSHOT_VERSION,
+    }, lock)
+    logger.info("Snapshot %s refreshed (%s rows)", name, len(df))
+    return df, totals, fetched_at, changes
+
+
+DATASETS = {
+    "country": DatasetSpec(
+        url=COUNTRY_URL,
+        drop={},
+        totals={"Monat": JAHRESTOTAL, "Herkunftsland": ALL_ORIGINS},
+        enrich=True,
+        ttl=dataset_ttl("country"),
+    ),
+    "supply": DatasetSpec(
+        url=SUPPLY_URL,
+        drop={},
+        totals={"Monat": JAHRESTOTAL},
+        enrich=False,
+        ttl=dataset_ttl("supply"),
+    ),
+    "kanton": DatasetSpec(
+        url=KANTON_URL,
+        drop={
+            "Herkunftsland": ['Baltische Staaten', 'Australien, Neuseeland, Ozeanien', 'Golf-Staaten', 'Serbien und Montenegro', 'Zentralamerika, Karibik'],
+        },
+        totals={"Monat": JAHRESTOTAL, "Kanton": NATIONAL, "Herkunftsland": ALL_ORIGINS},
+        enrich=True,
+        ttl=dataset_ttl("kanton"),
+    ),
+}
 
 
-# Load data
-@st.cache_data
-def load_data():
-    df_country = download_data(COUNTRY_URL)
-    df_country = filter_data(df_country)
-    df_country = pivot_data(df_country, ["Jahr", "Monat", "Gemeinde", "Herkunftsland"], "Indikator", "DATA")
-    df_country = convert_to_datetime(df_country)
-    df_country = convert_columns(df_country, ["Logiernächte", "Ankünfte"])
-    df_country = df_country[df_country['Ankünfte'].apply(is_numeric) & df_country['Logiernächte'].apply(is_numeric)] #filter out not avaiable data
-    df_country = calculate_additional_columns(df_country, "Logiernächte", "Ankünfte", "Aufenthaltsdauer")
-    df_country = map_herkunftsland(df_country, "Herkunftsland", "Herkunftsland_grob")
-    df_country = df_country[(df_country["Monat"] != "Jahrestotal") & (df_country["Herkunftsland"] != "Herkunftsland - Total")]
-
-    df_supply = download_data(SUPPLY_URL)
-    df_supply = filter_data(df_supply)
-    df_supply = pivot_data(df_supply, ["Jahr", "Monat", "Gemeinde"], "Indikator", "DATA")
-    df_supply = convert_to_datetime(df_supply)
-    df_supply = convert_columns(df_supply, ["Ankünfte", "Betriebe", "Betten", "Bettenauslastung in %", "Logiernächte", "Zimmer", "Zimmerauslastung in %", "Zimmernächte"])
-    df_supply = df_supply[df_supply['Ankünfte'].apply(is_numeric) & df_supply['Logiernächte'].apply(is_numeric)] #filter out not avaiable data
-
-    df_kanton = download_data(KANTON_URL)
-    df_kanton = filter_data(df_kanton)
-    df_kanton = df_kanton[(df_kanton["Kanton"] != "Schweiz")]
-    df_kanton = df_kanton[~df_kanton["Herkunftsland"].isin(['Baltische Staaten', 'Australien, Neuseeland, Ozeanien', 'Golf-Staaten', 'Serbien und Montenegro', 'Zentralamerika, Karibik'])]
-    df_kanton = pivot_data(df_kanton, ["Jahr", "Monat", "Kanton", "Herkunftsland"], "Indikator", "DATA")
-    df_kanton = convert_to_datetime(df_kanton)
-    df_kanton = convert_columns(df_kanton, ["Logiernächte", "Ankünfte"])
-    df_kanton = calculate_additional_columns(df_kanton, "Logiernächte", "Ankünfte", "Aufenthaltsdauer")
-    df_kanton = df_kanton[df_kanton['Ankünfte'].apply(is_numeric) & df_kanton['Logiernächte'].apply(is_numeric)] #filter out not avaiable data
-    df_kanton = map_herkunftsland(df_kanton, "Herkunftsland", "Herkunftsland_grob")
-    df_kanton = df_kanton[(df_kanton["Monat"] != "Jahrestotal") & (df_kanton["Herkunftsland"] != "Herkunftsland - Total")]
-
-    df_country['Jahr'] = df_country['Jahr'].astype(int)
-    df_supply['Jahr'] = df_supply['Jahr'].astype(int)
-    df_kanton['Jahr'] = df_kanton['Jahr'].astype(int)
+# Shared frames
+# The frames of the store and their period views are shared by all sessions and reruns, never copied.
+# Their arrays are made read-only so writing into them raises. Replacing, adding or removing a column
+# swaps arrays of the frame instead, which frame_modified catches after the page ran.
 
-    #df_hotels = pd.read_feather(f"data/20230721_Hotels.feather")
+def freeze_frame(df: pd.DataFrame) -> pd.DataFrame:
+    for values in df._mgr.arrays:
+        array = values if isinstance(values, np.ndarray) else getattr(values, "_ndarray", None)  # Categorical, DatetimeArray
+        if array is not None:
+            array.flags.writeable = False
+    return df
+
+# The index, the columns and the arrays themselves: compared by identity, so a column replaced with
+# data of the same shape counts. Holding the arrays keeps their ids from being reused.
+def frame_fingerprint(df: pd.DataFrame) -> tuple:
+    return df.index, tuple(df.columns), tuple(df._mgr.arrays)
+
+def frame_modified(df: pd.DataFrame, fingerprint: tuple) -> bool:
+    index, columns, arrays = fingerprint
+    current = df._mgr.arrays
+    return (df.index is not index or tuple(df.columns) != columns or len(current) != len(arrays)
+            or any(array is not before for array, before in zip(current, arrays)))
+
+
+# Dataset store
+# One store per process keeps the last good frame of every dataset. Each dataset refreshes on its
+# own schedule in the background while the pages keep serving the frame they have. A failed refresh
+# keeps the old frame (or the expired snapshot on disk) and is retried after REFRESH_RETRY.
+
+@dataclass
+class DatasetState:
+    df: pd.DataFrame | None = None
+    totals: pd.DataFrame | None = None  # official totals of df, see split_totals
+    expires: datetime.datetime | None = None
+    error: str | None = None
+    future: Future | None = None
+    stage_cache: dict = field(default_factory=dict)
+    revision: int = 0  # bumped whenever df changes, key for caches built on top of it
+    base_revision: int = 0  # revision of the last full load, every Gemeinde (Kanton) changed with it
+    member_revisions: dict = field(default_factory=dict)  # Gemeinde (Kanton) -> revision of an incremental refresh that changed its rows
+    version: str | None = None  # snapshot version and raw sha256 of df, stable across restarts
+
+class DatasetStore:
+    def __init__(self, session: requests.Session, lock: threading.Lock):
+        self.session = session
+        self.manifest_lock = lock
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=len(DATASETS), thread_name_prefix="dataset_store")
+        self.states = {name: DatasetState() for name in DATASETS}
+
+    def refresh(self, name: str) -> None:
+        spec, state = DATASETS[name], self.states[name]
+        started = time.monotonic()
+        try:
+            df, totals, fetched_at, changes = load_snapshot(name, spec, self.session, self.manifest_lock, state.stage_cache)
+        except Exception as e:
+            logger.exception("Dataset %s failed to refresh", name)
+            with self.lock:
+                state.error = f"{type(e).__name__}: {e}"
+                state.expires = datetime.datetime.now(datetime.timezone.utc) + REFRESH_RETRY
+            return
+        logger.info("Dataset %s loaded in %.1fs (%d rows, %.1f MB)", name, time.monotonic() - started,
+                    len(df), df.memory_usage(deep=True).sum() / 1e6)
+        version = f"{SNAPSHOT_VERSION}-{read_manifest()[name]['sha256']}"
+        with self.lock:
+            # an unchanged dataset keeps the frame the sessions already share
+            if changes is not None or state.df is None:
+                state.df, state.totals = freeze_frame(df), freeze_frame(totals)
+                state.revision += 1
+                if changes is None or changes.get("full"):
+                    state.base_revision, state.member_revisions = state.revision, {}
+                else:
+                    state.member_revisions.update(dict.fromkeys(changes.get(ROW_INDEX[name], []), state.revision))
+                state.version = version
+            state.error = None
+            state.expires = next_refresh(fetched_at, spec.ttl)
+
+    # Forgets a frame that was modified in place, the next call reloads it from the snapshot or, without
+    # one, refreshes it right away
+    def discard(self, name: str) -> None:
+        with self.lock:
+            self.states[name].df = None
+            self.states[name].future = None
+            self.states[name].expires = None
+
+    # Version of the frame of dataset name if revision is still current, else None
+    def version(self, name: str, revision: int) -> str | None:
+        with self.lock:
+            state = self.states[name]
+            return state.version if state.revision == revision else None
+
+    # Revision at which the rows of member (a Gemeinde or Kanton) of dataset name last changed, revision
+    # itself if it is no longer current
+    def member_revision(self, name: str, revision: int, member: str) -> int:
+        with self.lock:
+            state = self.states[name]
+            if state.revision != revision:
+                return revision
+            return max(state.base_revision, state.member_revisions.get(member, 0))
+
+    # Starts a refresh for every expired dataset. Only datasets without any frame are waited for,
+    # expired ones revalidate in the background and keep serving the frame they have.
+    # After a restart the snapshot on disk is served right away, whatever its age.
+    def frames(self, timeout: float) -> tuple[dict[str, pd.DataFrame | None], dict[str, pd.DataFrame | None], dict[str, int], dict[str, str]]:
+        # the snapshots are read without holding the lock, the other sessions don't wait on the disk
+        with self.lock:
+            unloaded = [name for name, state in self.states.items() if state.df is None and state.future is None]
+        snapshots = {name: read_snapshot(name) for name in unloaded}
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with self.lock:
+            for name, state in self.states.items():
+                # another session or a refresh may have installed a frame meanwhile
+                if snapshots.get(name) is not None and state.df is None:
+                    df, totals, fetched_at, sha256 = snapshots[name]
+                    state.df, state.totals = freeze_frame(df), freeze_frame(totals)
+                    state.revision += 1
+                    state.base_revision, state.member_revisions = state.revision, {}
+                    state.version = f"{SNAPSHOT_VERSION}-{sha256}"
+                    state.expires = next_refresh(fetched_at, DATASETS[name].ttl)
+                idle = state.future is None or state.future.done()
+                if idle and (state.expires is None or now >= state.expires):
+                    state.future = self.executor.submit(self.refresh, name)
+            pending = {name: state.future for name, state in self.states.items() if state.df is None}
+
+        started = time.monotonic()
+        for future in pending.values():
+            try:
+                future.result(timeout=max(timeout - (time.monotonic() - started), 0))
+            except FuturesTimeoutError:
+                pass
+
+        with self.lock:
+            frames = {name: state.df for name, state in self.states.items()}
+            totals = {name: state.totals for name, state in self.states.items()}
+            revisions = {name: state.revision for name, state in self.states.items()}
+            errors = {name: state.error for name, state in self.states.items() if state.error}
+        for name, df in frames.items():
+            if df is None and name not in errors:
+                errors[name] = f"Zeitüberschreitung nach {timeout}s"
+        return frames, totals, revisions, errors
+
+@st.cache_resource
+def dataset_store() -> DatasetStore:
+    return DatasetStore(http_session(), manifest_lock())
+
+
+# Dense cubes
+# country, kanton and supply are also held as dense arrays with named axes: time x region (x origin)
+# x indicator. Cells without a row are NaN and `present` marks the cells that had one, so aggregates
+# skip empty groups like an observed groupby. Page aggregates become axis reductions over a few MB
+# instead of hash groupbys over the long frames. Cumulative sums along Date answer totals over any
+# range of months as the difference of two rows, without a pass over the months in between.
+
+CUBE_AXES = {
+    "country": ("Date", "Gemeinde", "Herkunftsland"),
+    "kanton": ("Date", "Kanton", "Herkunftsland"),
+    "supply": ("Date", "Gemeinde"),
+}
+# How every measure aggregates: flows add up, stocks and rates are averaged over the cells, ratios are
+# recomputed from their aggregated numerator and denominator. Dimensions and other columns are never
+# aggregated, a measure missing here raises.
+MEASURES = {
+    'Ankünfte': 'sum',
+    'Logiernächte': 'sum',
+    'Zimmernächte': 'sum',
+    'Betriebe': 'mean',
+    'Zimmer': 'mean',
+    'Betten': 'mean',
+    'Zimmerauslastung in %': 'mean',
+    'Bettenauslastung in %': 'mean',
+    'Aufenthaltsdauer': 'ratio',
+}
+RATIOS = {'Aufenthaltsdauer': ('Logiernächte', 'Ankünfte')}
+TOTALS = ['Ankünfte', 'Logiernächte', 'Aufenthaltsdauer']
+
+@dataclass
+class DenseCube:
+    axes: list[str]
+    labels: list[pd.Index]  # members per axis, Date first
+    indicators: list[str]
+    values: np.ndarray  # shape (*axes, indicator)
+    present: np.ndarray  # shape (*axes)
+    # cumulative sums along Date with a leading row of zeros, see prefix_sums
+    prefix: np.ndarray  # values, NaN counted as 0
+    prefix_counts: np.ndarray  # values that are not NaN
+    prefix_rows: np.ndarray  # rows, shape (Date + 1, *other axes)
+
+    def _take(self, axis: int, key, prefix_key=None) -> tuple[np.ndarray, ...]:
+        index = (slice(None),) * axis + (key,)
+        prefix_index = (slice(None),) * axis + (key if prefix_key is None else prefix_key,)
+        return (self.values[index], self.present[index],
+                self.prefix[prefix_index], self.prefix_counts[prefix_index], self.prefix_rows[prefix_index])
+
+    # View on the years start_year to end_year
+    def between(self, start_year: int, end_year: int) -> "DenseCube":
+        dates = self.labels[0]
+        start, stop = dates.searchsorted(pd.Timestamp(start_year, 1, 1)), dates.searchsorted(pd.Timestamp(end_year + 1, 1, 1))
+        arrays = self._take(0, slice(start, stop), slice(start, stop + 1))
+        return DenseCube(self.axes, [dates[start:stop]] + self.labels[1:], self.indicators, *arrays)
+
+    # View on one member, its axis is dropped
+    def select(self, axis: str, member: str) -> "DenseCube":
+        i = self.axes.index(axis)
+        arrays = self._take(i, self.labels[i].get_loc(member))
+        return DenseCube(self.axes[:i] + self.axes[i + 1:], self.labels[:i] + self.labels[i + 1:], self.indicators, *arrays)
+
+    # Sums, counts of values and counts of rows over the dates [start, stop) of the cube
+    def window(self, start: int = 0, stop: int | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        stop = len(self.labels[0]) if stop is None else stop
+        return (self.prefix[stop] - self.prefix[start], self.prefix_counts[stop] - self.prefix_counts[start],
+                self.prefix_rows[stop] - self.prefix_rows[start])
+
+    # Sums the members of axis into groups, groups is a Categorical with one group per member
+    def regroup(self, axis: str, groups: pd.Categorical, name: str) -> "DenseCube":
+        i = self.axes.index(axis)
+        values, present = [], []
+        for code in range(len(groups.categories)):
+            members = np.flatnonzero(groups.codes == code)
+            group_present = self.present.take(members, axis=i).any(axis=i)
+            member_values = self.values.take(members, axis=i)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                group_values = np.stack([self._reduce(member_values, None, indicator, i) for indicator in self.indicators], axis=-1)
+            group_values[~group_present] = np.nan
+            values.append(group_values)
+            present.append(group_present)
+        labels = pd.CategoricalIndex(groups.categories, categories=groups.categories)
+        values, present = np.stack(values, axis=i), np.stack(present, axis=i)
+        return DenseCube(self.axes[:i] + [name] + self.axes[i + 1:], self.labels[:i] + [labels] + self.labels[i + 1:],
+                         self.indicators, values, present, *prefix_sums(values, present))
+
+    # One measure of values reduced over axis as MEASURES says, NaN is skipped as in pandas.
+    # counts are the values that are not NaN, None to count them in values.
+    def _reduce(self, values: np.ndarray, counts: np.ndarray | None, measure: str, axis) -> np.ndarray:
+        how = MEASURES[measure]
+        if how == 'ratio':
+            numerator, denominator = RATIOS[measure]
+            return self._reduce(values, counts, numerator, axis) / self._reduce(values, counts, denominator, axis)
+        i = self.indicators.index(measure)
+        result = np.nansum(values[..., i], axis=axis)
+        if how == 'mean':
+            result = result / (~np.isnan(values[..., i]) if counts is None else counts[..., i]).sum(axis=axis)
+        return result
+
+    # Long frame with one row per group of the keep axes that has rows, like an observed, sorted groupby,
+    # with one column per measure. Without Date in keep the totals over the dates come from the prefix sums.
+    def agg(self, keep: list[str], measures: list[str]) -> pd.DataFrame:
+        if 'Date' in keep:
+            axes, values, counts, present = self.axes, self.values, None, self.present
+        else:
+            axes = self.axes[1:]
+            values, counts, rows = self.window()
+            present = rows > 0
+        other = tuple(i for i, axis in enumerate(axes) if axis not in keep)
+        remaining = [axis for axis in axes if axis in keep]
+        order = [remaining.index(axis) for axis in keep]
+        groups = np.nonzero(present.any(axis=other).transpose(order))
+
+        frame = {axis: self.labels[self.axes.index(axis)].take(codes) for axis, codes in zip(keep, groups)}
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for measure in measures:
+                frame[measure] = self._reduce(values, counts, measure, other).transpose(order)[groups]
+        return pd.DataFrame(frame)
+
+def prefix_sums(values: np.ndarray, present: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    prefix = np.zeros((len(values) + 1,) + values.shape[1:])
+    np.nancumsum(values, axis=0, out=prefix[1:])
+    prefix_counts = np.zeros(prefix.shape, dtype=np.int32)
+    np.cumsum(~np.isnan(values), axis=0, out=prefix_counts[1:])
+    prefix_rows = np.zeros((len(present) + 1,) + present.shape[1:], dtype=np.int32)
+    np.cumsum(present, axis=0, out=prefix_rows[1:])
+    return prefix, prefix_counts, prefix_rows
+
+def build_cube(df: pd.DataFrame, axes: tuple[str, ...]) -> DenseCube:
+    labels, codes = [], []
+    for axis in axes:
+        if axis == "Date":
+            dates = pd.DatetimeIndex(np.unique(df['Date'].to_numpy()))
+            labels.append(dates)
+            codes.append(dates.searchsorted(df['Date'].to_numpy()))
+        else:
+            categories = df[axis].cat.categories
+            labels.append(pd.CategoricalIndex(categories, categories=categories))
+            codes.append(df[axis].cat.codes.to_numpy())
+    indicators = [column for column in df.select_dtypes("number").columns if column != "Jahr"]
+    shape = tuple(len(members) for members in labels)
+
+    present = np.zeros(shape, dtype=bool)
+    present[tuple(codes)] = True
+    if present.sum() != len(df):
+        raise ValueError(f"Rows are not unique over {axes}")
+    values = np.full(shape + (len(indicators),), np.nan)
+    values[tuple(codes)] = df[indicators].to_numpy(dtype=np.float64)
+    arrays = (values, present) + prefix_sums(values, present)
+    for array in arrays:
+        array.flags.writeable = False
+    return DenseCube(list(axes), labels, indicators, *arrays)
+
+# Cube of the official totals, months only: the Jahrestotal rows have no Date
+def build_totals_cube(totals: pd.DataFrame, axes: tuple[str, ...]) -> DenseCube:
+    return build_cube(totals[totals['Date'].notna()], axes)
+
+# Datasets whose pages show figures BFS publishes as totals, read from the official totals cube
+# instead of summing the frame: the national figures and the all-origin series per Kanton
+OFFICIAL_PAGES = ("kanton",)
+
+# Whole cube the page aggregates of dataset are built from
+def source_cube(cubes: "AggregateCache", dataset: str, revision: int, df: pd.DataFrame, totals: pd.DataFrame) -> DenseCube:
+    if dataset in OFFICIAL_PAGES:
+        return aggregate(cubes, build_totals_cube, dataset, revision, None, totals, CUBE_AXES[dataset])
+    return aggregate(cubes, build_cube, dataset, revision, None, df, CUBE_AXES[dataset])
+
+# Cube of the selected years for the pages
+def dataset_cube(dataset: str) -> DenseCube:
+    cube = source_cube(dense_cubes(), dataset, revisions[dataset], frames[dataset], official_totals[dataset])
+    return cube.between(start_year, end_year)
+
+
+# Page aggregates
+# Every table the pages show is materialized as a rollup: once per dataset revision and selected years,
+# for all indicators and, for country, for all Gemeinden. Rollups are kept in the aggregate cache, keyed
+# by the function, the revision of the dataset read, the selected years and the arguments, so a refresh
+# makes them unreachable. The warmer builds them for the preselected years, pages only read them.
+
+INDICATORS = ['Logiernächte', 'Ankünfte']
+
+def totals_by_date(cube: DenseCube) -> pd.DataFrame:
+    return cube.agg(['Date'], TOTALS)
+
+def totals_by_month(cube: DenseCube) -> pd.DataFrame:
+    grouped_df = totals_by_date(cube)
+    grouped_df.insert(1, 'Monat', pd.Categorical.from_codes(grouped_df['Date'].dt.month - 1, categories=list(MONTH_MAPPING), ordered=True))
+    grouped_df.insert(2, 'Jahr', grouped_df['Date'].dt.year)
+    return grouped_df
+
+# Sparkline tables: one row per member of the axes after Date that has rows, optionally without the member
+# exclude of the last axis. Per indicator the monthly series as a list for the LineChartColumn, the total
+# over the months and its share in % of the total of the rows with the same leading members (all rows for
+# a single axis). Built from the member x month arrays of the cube, formats are left to the column config.
+def series_table(cube: DenseCube, indicators: list[str], exclude: str | None = None) -> pd.DataFrame:
+    axes = cube.axes[1:]
+    present = np.moveaxis(cube.present, 0, -1)
+    observed = present.any(axis=-1)
+    if exclude is not None:
+        observed[..., cube.labels[-1].get_loc(exclude)] = False
+    members = np.nonzero(observed)
+    row_present = present[members]
+    ends = np.cumsum(row_present.sum(axis=1))
+    sums = cube.window()[0]
+    table = {axis: cube.labels[i + 1].take(codes) for i, (axis, codes) in enumerate(zip(axes, members))}
+    for indicator in indicators:
+        i = cube.indicators.index(indicator)
+        # a month without a value counts as 0 as in the groupby sums
+        values = np.nan_to_num(np.moveaxis(cube.values[..., i], 0, -1)[members])
+        totals = sums[..., i][members]
+        group_totals = np.bincount(members[0], weights=totals)[members[0]] if len(axes) > 1 else totals.sum()
+        table[indicator] = [run.tolist() for run in np.split(values[row_present], ends)[:-1]]
+        table[f"{indicator} Total"] = totals
+        with np.errstate(invalid='ignore', divide='ignore'):
+            table[f"{indicator} Anteil"] = 100 * totals / group_totals
+    return pd.DataFrame(table)
+
+def without_member(df: pd.DataFrame, column: str, member: str) -> pd.DataFrame:
+    return df[(df[column] != member).to_numpy()].reset_index(drop=True)
+
+# From the official totals cube: the Kanton Schweiz is the national total, Herkunftsland - Total all origins
+def kanton_rollups(cube: DenseCube) -> dict[str, pd.DataFrame]:
+    national, all_origins = cube.select('Kanton', NATIONAL), cube.select('Herkunftsland', ALL_ORIGINS)
+    return {
+        "Date": totals_by_month(national.select('Herkunftsland', ALL_ORIGINS)),
+        "Kanton": series_table(all_origins, INDICATORS, exclude=NATIONAL),
+        "Herkunftsland": series_table(national, INDICATORS, exclude=ALL_ORIGINS),
+        "Herkunftsland_total": without_member(national.agg(['Herkunftsland'], INDICATORS), 'Herkunftsland', ALL_ORIGINS),
+    }
+
+def supply_rollups(cube: DenseCube) -> dict[str, pd.DataFrame]:
+    return {"Gemeinde": series_table(cube, INDICATORS)}
+
+# The rows per Herkunftsland and Date of a Gemeinde are the rows of the frame itself, see region_rows
+def country_rollups(cube: DenseCube) -> dict[str, pd.DataFrame]:
+    grob = cube.regroup('Herkunftsland', domestic_international(cube.labels[cube.axes.index('Herkunftsland')]), 'Herkunftsland_grob')
+    return {
+        "Herkunftsland": series_table(cube, INDICATORS),
+        "Herkunftsland_grob": grob.agg(['Gemeinde', 'Herkunftsland_grob', 'Date'], INDICATORS),
+        "Herkunftsland_grob_total": grob.agg(['Gemeinde', 'Herkunftsland_grob'], INDICATORS),
+    }
+
+ROLLUPS = {"country": country_rollups, "supply": supply_rollups, "kanton": kanton_rollups}
+
+def build_rollups(cube: DenseCube, dataset: str) -> dict[str, pd.DataFrame]:
+    return {name: freeze_frame(table) for name, table in ROLLUPS[dataset](cube).items()}
+
+
+# Rankings
+# The Herkunftsländer of every Gemeinde ranked by each indicator over the selected years, built with
+# the rollups from the country cube. top() answers the k largest plus the remainder as "Others" with
+# array indexing, the charts get their tables without a pass over the rows.
+
+TOP_ORIGINS = 15
+OTHERS = 'Others'
+
+@dataclass
+class OriginRanking:
+    cube: DenseCube  # country cube of the selected years
+    totals: np.ndarray  # Gemeinde x Herkunftsland x indicator
+    order: np.ndarray  # Herkunftsländer by descending total, Gemeinde x rank x indicator
+    observed: np.ndarray  # number of Herkunftsländer with rows per Gemeinde, they come first in order
+
+    def _ranked(self, gemeinde: str, indicator: str) -> tuple[int, np.ndarray]:
+        g = self.cube.labels[1].get_loc(gemeinde)
+        return g, self.order[g, :self.observed[g], self.cube.indicators.index(indicator)]
+
+    def ranked(self, gemeinde: str, indicator: str) -> list[str]:
+        return self.cube.labels[2].take(self._ranked(gemeinde, indicator)[1]).astype(str).tolist()
+
+    # Totals and monthly rows of the k largest Herkunftsländer and of the others together, in the
+    # alphabetical order the charts had with groupby
+    def top(self, gemeinde: str, indicator: str, k: int) -> tuple[pd.DataFrame, pd.DataFrame]:
+        g, ranked = self._ranked(gemeinde, indicator)
+        groups = [ranked[:k]] + ([ranked[k:]] if len(ranked) > k else [])
+        names = self.cube.labels[2].take(ranked[:k]).astype(str).tolist() + [OTHERS] * (len(groups) - 1)
+        columns = [self.cube.indicators.index(column) for column in INDICATORS]
+
+        totals = self.totals[g][:, columns]
+        values, present = self.cube.values[:, g][..., columns], self.cube.present[:, g]
+        group_totals = np.concatenate([totals[groups[0]]] + [totals[rest].sum(axis=0, keepdims=True) for rest in groups[1:]])
+        # a cell without a value counts as 0 as in the groupby sums, for the top ones as for the others
+        group_values = np.concatenate([np.nan_to_num(values[:, groups[0]])] + [np.nansum(values[:, rest], axis=1, keepdims=True) for rest in groups[1:]], axis=1)
+        group_present = np.concatenate([present[:, groups[0]]] + [present[:, rest].any(axis=1, keepdims=True) for rest in groups[1:]], axis=1)
+
+        by_name = np.argsort(names, kind='stable')
+        names = np.array(names, dtype=object)[by_name]
+        no_date = pd.DataFrame({'Herkunftsland_grouped': names, **dict(zip(INDICATORS, group_totals[by_name].T))})
+        group_codes, date_codes = np.nonzero(group_present.T[by_name])
+        date = pd.DataFrame({
+            'Herkunftsland_grouped': names[group_codes],
+            'Date': self.cube.labels[0].take(date_codes),
+            **dict(zip(INDICATORS, group_values.transpose(1, 0, 2)[by_name][group_codes, date_codes].T)),
+        })
+        return no_date, date
+
+def build_ranking(cube: DenseCube) -> OriginRanking:
+    totals, _, rows = cube.window()
+    observed = rows > 0
+    # Herkunftsländer without rows sort last, ties keep the order of the categories
+    order = np.argsort(np.where(observed[..., None], -totals, np.inf), axis=1, kind='stable')
+    return OriginRanking(cube, totals, order, observed.sum(axis=1))
+
+
+# KPIs
+# The metrics of the Kennzahlen pages for every region of a dataset at once: totals and monthly means
+# over the selected years, the latest month of those years and the year to date, each against the
+# same calendar months one year earlier. The previous year is read from the whole history, so it is
+# there even when the selected years start with the latest one.
+
+KPI_REGIONS = {"supply": "Gemeinde", "kanton": "Kanton"}
+KPI_METRICS = ["total", "mean", "month", "month_last_year", "ytd", "ytd_last_year", "month_diff", "month_change", "ytd_change"]
+
+# Sums and counts of values per region and indicator over the dates [start, stop), summed over the origins
+def region_window(cube: DenseCube, start: int, stop: int, columns: list[int]) -> tuple[np.ndarray, np.ndarray]:
+    sums, counts, _ = cube.window(start, stop)
+    origins = tuple(range(1, sums.ndim - 1))
+    return sums[..., columns].sum(axis=origins), counts[..., columns].sum(axis=origins)
+
+# Every metric is a difference of prefix sums, a new period costs no pass over the data
+def kpi_table(cube: DenseCube, period: tuple[int, int], indicators: list[str]) -> pd.DataFrame:
+    columns = [cube.indicators.index(indicator) for indicator in indicators]
+    dates = cube.labels[0]  # every month of a whole cube has rows
+    start, stop = dates.searchsorted(pd.Timestamp(period[0], 1, 1)), dates.searchsorted(pd.Timestamp(period[1] + 1, 1, 1))
+    regions = cube.labels[1].astype(str)
+    index = pd.MultiIndex.from_product([regions, indicators], names=["Region", "Kennzahl"])
+    # no month of the dataset in period (before its first or after its latest month): no metrics, no headline month
+    if start == stop:
+        table = pd.DataFrame(np.nan, index=index, columns=KPI_METRICS)
+        table.attrs.update(first=None, month=None)
+        return freeze_frame(table)
+    first, latest = dates[start], dates[stop - 1]
+    # same calendar month one year earlier, an empty window where that month is missing
+    last_year = dates.get_indexer([latest - pd.DateOffset(years=1)])[0]
+    windows = {
+        "period": (start, stop),
+        "month": (stop - 1, stop),
+        "month_last_year": (last_year, last_year + 1) if last_year >= 0 else (0, 0),
+        "ytd": (dates.searchsorted(pd.Timestamp(latest.year, 1, 1)), stop),
+        "ytd_last_year": (dates.searchsorted(pd.Timestamp(latest.year - 1, 1, 1)), dates.searchsorted(latest - pd.DateOffset(years=1), side='right')),
+    }
+    sums, counts = {}, {}
+    for name, (window_start, window_stop) in windows.items():
+        sums[name], counts[name] = region_window(cube, window_start, window_stop, columns)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        metrics = {
+            "total": sums["period"],
+            "mean": sums["period"] / counts["period"],
+            "month": np.where(counts["month"] > 0, sums["month"], np.nan),
+            "month_last_year": np.where(counts["month_last_year"] > 0, sums["month_last_year"], np.nan),
+            "ytd": sums["ytd"],
+            "ytd_last_year": sums["ytd_last_year"],
+        }
+        metrics["month_diff"] = metrics["month"] - metrics["month_last_year"]
+        metrics["month_change"] = np.round((metrics["month"] - metrics["month_last_year"]) / metrics["month_last_year"] * 100, 1)
+        metrics["ytd_change"] = np.round((metrics["ytd"] - metrics["ytd_last_year"]) / metrics["ytd_last_year"] * 100, 1)
+
+    table = pd.DataFrame({name: metrics[name].reshape(-1) for name in KPI_METRICS}, index=index)
+    table.attrs.update(first=first, month=latest)
+    return freeze_frame(table)
+
+# The kanton KPIs come from the official totals of all origins, the Kanton Schweiz is the national region
+def build_kpis(cube: DenseCube, dataset: str, period: tuple[int, int]) -> pd.DataFrame:
+    if dataset == "kanton":
+        return kpi_table(cube.select('Herkunftsland', ALL_ORIGINS), period, INDICATORS)
+    return kpi_table(cube, period, list(cube.indicators))
+
+class AggregateCache:
+    def __init__(self, size: int):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def get(self, key: tuple, compute):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        value = compute()
+        with self.lock:
+            self.entries[key] = value
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return value
+
+@st.cache_resource
+def aggregate_cache() -> AggregateCache:
+    return AggregateCache(AGGREGATE_CACHE_SIZE)
+
+@st.cache_resource
+def dense_cubes() -> AggregateCache:
+    return AggregateCache(2 * len(DATASETS))  # room for the next revision while the old one is in use
+
+def aggregate(cache: AggregateCache, compute, dataset: str, revision: int, period: tuple[int, int], df: pd.DataFrame, *args):
+    return cache.get((compute.__name__, dataset, revision, period, args), lambda: compute(df, *args))
+
+ROW_INDEX = {"country": "Gemeinde", "supply": "Gemeinde", "kanton": "Kanton"}
+
+# For the pages: rows of one Gemeinde (or Kanton) of dataset in the selected years. The rows of a
+# region are ordered by Date, so this is a read-only slice of the shared frame, no scan and no copy.
+def region_rows(dataset: str, df: pd.DataFrame, member: str) -> pd.DataFrame:
+    ranges = aggregate(aggregate_cache(), row_ranges, dataset, revisions[dataset], None, df, ROW_INDEX[dataset])
+    rows = df.iloc[ranges.get(member, slice(0, 0))]
+    dates = rows['Date'].to_numpy()
+    start, stop = np.datetime64(f"{start_year}-01-01"), np.datetime64(f"{end_year + 1}-01-01")
+    return rows.iloc[np.searchsorted(dates, start):np.searchsorted(dates, stop)]
+
+# For the pages: the rollup name of dataset for the selected years, shared and read-only
+def rollup(dataset: str, name: str) -> pd.DataFrame:
+    tables = aggregate(aggregate_cache(), build_rollups, dataset, revisions[dataset], (start_year, end_year), dataset_cube(dataset), dataset)
+    return tables[name]
+
+# For the pages: the KPIs of dataset for the selected years, one row per (Region, Kennzahl)
+def page_kpis(dataset: str) -> pd.DataFrame:
+    cube = source_cube(dense_cubes(), dataset, revisions[dataset], frames[dataset], official_totals[dataset])
+    return aggregate(aggregate_cache(), build_kpis, dataset, revisions[dataset], (start_year, end_year), cube, dataset, (start_year, end_year))
+
+# Label of a month as in the data, e.g. "Juli 2024"
+def month_label(date: pd.Timestamp) -> str:
+    return f"{list(MONTH_MAPPING)[date.month - 1]} {date.year}"
+
+# For the pages: the ranking of the Herkunftsländer per Gemeinde for the selected years
+def origin_ranking() -> OriginRanking:
+    return aggregate(aggregate_cache(), build_ranking, "country", revisions["country"], (start_year, end_year), dataset_cube("country"))
+
+# Metadata of a frame, computed once per revision: the months it covers and the members of its
+# dimensions in category order, which is the order of the rows for the region column
+@dataclass
+class DatasetMeta:
+    first: pd.Timestamp
+    latest: pd.Timestamp
+    members: dict[str, list[str]]
+
+def build_meta(df: pd.DataFrame) -> DatasetMeta:
+    dates = df['Date'].to_numpy()
+    members = {}
+    for column in ("Gemeinde", "Kanton", "Herkunftsland"):
+        if column in df.columns:
+            codes = np.unique(df[column].cat.codes.to_numpy())
+            members[column] = df[column].cat.categories.take(codes[codes >= 0]).tolist()
+    return DatasetMeta(pd.Timestamp(dates.min()), pd.Timestamp(dates.max()), members)
+
+# Preselected Zeitraum: DEFAULT_START_YEAR to the latest year with data, before any data is loaded
+# the year of the publication cutoff
+def default_period(metas: list[DatasetMeta], today: datetime.date) -> tuple[int, int]:
+    return DEFAULT_START_YEAR, max((meta.latest.year for meta in metas), default=publication_cutoff(today).year)
+
+# For the pages: the metadata of dataset
+def dataset_meta(dataset: str) -> DatasetMeta:
+    return aggregate(aggregate_cache(), build_meta, dataset, revisions[dataset], None, frames[dataset])
+
+# Rows of member in a rollup ordered by column
+def rollup_rows(df: pd.DataFrame, column: str, member: str) -> pd.DataFrame:
+    codes = df[column].cat.codes.to_numpy()
+    code = df[column].cat.categories.get_indexer([member])[0]
+    return df.iloc[np.searchsorted(codes, code):np.searchsorted(codes, code, side='right')]
+
+
+# Figure factory
+# The charts are built as graph_objects straight from the columns of the rollups, with the traces and
+# layout plotly.express gave them: one trace per value of the color column in the order the values first
+# appear (or in order), colored from colors in that order. plotly.express regroups the whole frame and
+# builds its figure through generic machinery on every call, here each trace is one slice of an array.
+#
+# CHART_RENDER_MODE sets how the line and area charts reach the browser, any of
+#   webgl: WebGL traces, drawn with straight segments as WebGL has no splines, areas stacked here
+#   binary: integral numbers as int32 and dates as epoch milliseconds, the narrowest exact arrays.
+#           plotly >= 6 sends them as base64 typed arrays, older versions as short JSON numbers
+#   downsample: series longer than CHART_MAX_POINTS reduced with largest-triangle-three-buckets,
+#               which keeps peaks and troughs
+# Every figure carries the default template with the trace defaults of its own trace types only.
+
+RENDER_MODES = frozenset({"webgl", "binary", "downsample"})
+if not CHART_RENDER_MODE <= RENDER_MODES:
+    raise ValueError(f"CHART_RENDER_MODE: unknown render modes {sorted(CHART_RENDER_MODE - RENDER_MODES)}")
+
+# Row positions of every value of column, in the order of first appearance or of order
+def series_rows(values: np.ndarray, order: list[str] | None = None) -> dict[str, np.ndarray]:
+    codes, names = pd.factorize(values)
+    runs = np.split(np.argsort(codes, kind='stable'), np.cumsum(np.bincount(codes, minlength=len(names)))[:-1])
+    rows = {str(name): run for name, run in zip(names, runs)}
+    if order is not None:
+        rows = {**{name: rows[name] for name in order if name in rows}, **rows}
+    return rows
+
+# Values as sent to the browser
+def chart_array(values: np.ndarray) -> np.ndarray:
+    if "binary" not in CHART_RENDER_MODE:
+        return values
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ms]').astype(np.int64)
+    if (values.dtype.kind == 'f' and np.isfinite(values).all() and np.array_equal(values, np.round(values))
+            and np.abs(values).max(initial=0) < 2**31):
+        return values.astype(np.int32)
+    return values
+
+# Positions of at most points values of y to draw, largest-triangle-three-buckets: the first and last
+# point and from every bucket in between the one spanning the largest triangle with its neighbours
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    if len(y) <= points or points < 3:
+        return np.arange(len(y))
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype('datetime64[ns]').astype(np.int64).astype(float)
+    elif x.dtype.kind not in 'iuf':
+        x = np.arange(len(y), dtype=float)
+    y = np.nan_to_num(y.astype(float))
+    edges = np.linspace(1, len(y) - 1, points - 1).astype(int)
+    keep = [0]
+    for bucket in range(points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        after = slice(stop, edges[bucket + 2]) if bucket + 2 < len(edges) else slice(len(y) - 1, len(y))
+        ax, ay, cx, cy = x[keep[-1]], y[keep[-1]], x[after].mean(), y[after].mean()
+        area = np.abs((ax - cx) * (y[start:stop] - ay) - (ax - x[start:stop]) * (cy - ay))
+        keep.append(start + int(np.argmax(area)))
+    keep.append(len(y) - 1)
+    return np.array(keep)
+
+# The series of a stacked chart on the union of their x, a series without a row for an x adds 0 as in the stack
+def aligned(series: list[tuple]) -> list[tuple]:
+    xs = np.unique(np.concatenate([series_x for _, series_x, _, _ in series]))
+    stacked = []
+    for name, series_x, series_y, prefix in series:
+        values = np.zeros(len(xs))
+        values[np.searchsorted(xs, series_x)] = series_y
+        stacked.append((name, xs, values, prefix))
+    return stacked
+
+# The default template reduced to the trace defaults of types, shared by the figures
+CHART_TEMPLATES = {}
+
+def chart_template(*types: str) -> go.layout.Template:
+    if types not in CHART_TEMPLATES:
+        template = pio.templates[pio.templates.default]
+        CHART_TEMPLATES[types] = go.layout.Template(data={name: template.data[name] for name in types}, layout=template.layout)
+    return CHART_TEMPLATES[types]
+
+def axes_layout(x_title: str, y_title: str, legend_title: str | None = None, **layout) -> dict:
+    return dict(xaxis=dict(anchor='y', domain=[0.0, 1.0], title_text=x_title),
+                yaxis=dict(anchor='x', domain=[0.0, 1.0], title_text=y_title),
+                legend=dict(title_text=legend_title, tracegroupgap=0), margin=dict(t=60), **layout)
+
+# px.line (px.area with stacked): one line per indicator of a list y, per value of color or a single one
+def line_figure(df: pd.DataFrame, x: str, y: str | list[str], colors: list[str], color: str | None = None,
+                line_shape: str | None = None, stacked: bool = False) -> go.Figure:
+    xs = df[x].to_numpy()
+    if isinstance(y, list):
+        series = [(column, xs, df[column].to_numpy(), f"variable={column}<br>") for column in y]
+        y_title, legend_title = "value", "variable"
+    elif color is None:
+        series = [("", xs, df[y].to_numpy(), "")]
+        y_title, legend_title = y, None
+    else:
+        ys = df[y].to_numpy()
+        series = [(name, xs[rows], ys[rows], f"{color}={name}<br>") for name, rows in series_rows(df[color].to_numpy()).items()]
+        y_title, legend_title = y, color
+    webgl = "webgl" in CHART_RENDER_MODE
+    if stacked and (webgl or "downsample" in CHART_RENDER_MODE):
+        series = aligned(series)
+    if "downsample" in CHART_RENDER_MODE:
+        if stacked:
+            keep = lttb(series[0][1], np.nansum([series_y for _, _, series_y, _ in series], axis=0), CHART_MAX_POINTS)
+            series = [(name, series_x[keep], series_y[keep], prefix) for name, series_x, series_y, prefix in series]
+        else:
+            series = [(name, series_x[keep], series_y[keep], prefix) for name, series_x, series_y, prefix in series
+                      for keep in [lttb(series_x, series_y, CHART_MAX_POINTS)]]
+
+    if webgl:
+        # areas are drawn as the cumulated series filled to the one below, the hover shows the own value
+        tops = np.nancumsum([series_y for _, _, series_y, _ in series], axis=0) if stacked else None
+        traces = [
+            go.Scattergl(x=chart_array(series_x), y=chart_array(tops[i] if stacked else series_y), name=name, legendgroup=name,
+                         showlegend=bool(name), mode='lines', line=dict(color=colors[i % len(colors)], dash='solid'),
+                         marker_symbol='circle', xaxis='x', yaxis='y',
+                         fill=('tozeroy' if i == 0 else 'tonexty') if stacked else None,
+                         customdata=chart_array(series_y) if stacked else None,
+                         hovertemplate=f"{prefix}{x}=%{{x}}<br>{y_title}=%{{{'customdata' if stacked else 'y'}}}<extra></extra>")
+            for i, (name, series_x, series_y, prefix) in enumerate(series)
+        ]
+    else:
+        line, area = (dict(shape=line_shape), dict(stackgroup='1', fillpattern_shape='')) if stacked else (dict(shape=line_shape, dash='solid'), {})
+        traces = [
+            go.Scatter(x=chart_array(series_x), y=chart_array(series_y), name=name, legendgroup=name, showlegend=bool(name), mode='lines',
+                       line=dict(line, color=colors[i % len(colors)]), marker_symbol='circle', orientation='v',
+                       hovertemplate=f"{prefix}{x}=%{{x}}<br>{y_title}=%{{y}}<extra></extra>", xaxis='x', yaxis='y', **area)
+            for i, (name, series_x, series_y, prefix) in enumerate(series)
+        ]
+    layout = axes_layout(x, y_title, legend_title, template=chart_template('scattergl' if webgl else 'scatter'))
+    if "binary" in CHART_RENDER_MODE and np.issubdtype(xs.dtype, np.datetime64):
+        layout['xaxis'].update(type='date')
+    return go.Figure(traces, layout)
+
+# px.bar with color=x: one bar trace per value of x
+def bar_figure(df: pd.DataFrame, x: str, y: str, colors: list[str], order: list[str] | None = None) -> go.Figure:
+    xs, ys = df[x].to_numpy(), chart_array(df[y].to_numpy())
+    series = series_rows(xs, order)
+    traces = [
+        go.Bar(x=xs[rows], y=ys[rows], name=name, legendgroup=name, offsetgroup=name, alignmentgroup='True', showlegend=True,
+               marker=dict(color=colors[i % len(colors)], pattern_shape=''), orientation='v', textposition='auto',
+               hovertemplate=f"{x}=%{{x}}<br>{y}=%{{y}}<extra></extra>", xaxis='x', yaxis='y')
+        for i, (name, rows) in enumerate(series.items())
+    ]
+    layout = axes_layout(x, y, x, barmode='relative', template=chart_template('bar'))
+    layout['xaxis'].update(categoryorder='array', categoryarray=list(dict.fromkeys(list(order or []) + list(series))))
+    return go.Figure(traces, layout)
+
+# px.pie, the slices in the order of the rows or of order
+def pie_figure(df: pd.DataFrame, names: str, values: str, colors: list[str], hole: float, order: list[str] | None = None) -> go.Figure:
+    labels, sizes = df[names].to_numpy(), chart_array(df[values].to_numpy())
+    ordered = {}
+    if order is not None:
+        rows = np.concatenate(list(series_rows(labels, order).values()))
+        labels, sizes, ordered = labels[rows], sizes[rows], dict(direction='clockwise', sort=False)
+    trace = go.Pie(labels=labels, values=sizes, hole=hole, name='', legendgroup='', showlegend=True, domain=dict(x=[0.0, 1.0], y=[0.0, 1.0]),
+                   hovertemplate=f"{names}=%{{label}}<br>{values}=%{{value}}<extra></extra>", **ordered)
+    return go.Figure([trace], dict(legend=dict(tracegroupgap=0), margin=dict(t=60), piecolorway=colors, template=chart_template('pie')))
+
+# Figure cache
+# The figures of a page section are built once and shared by all sessions, keyed by the section, its
+# selection (Gemeinde or Kanton and Kennzahl), the selected years, the palette and the revisions of the
+# datasets shown. Entries are evicted in LRU order once their serialized size exceeds FIGURE_CACHE_MB.
+# With FIGURE_CACHE_DIR set, figures are also written to disk under the snapshot versions of the datasets
+# instead of the revisions and survive a restart. Cached figures are shared, never update them.
+
+class FigureCache:
+    def __init__(self, max_bytes: int, directory: Path | None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.entries = OrderedDict()  # key -> (figures, serialized size)
+        self.bytes = 0
+        self.counts = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self.lock = threading.Lock()
+        if directory is not None:
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return dict(self.counts, entries=len(self.entries), bytes=self.bytes)
+
+    def path(self, disk_key: tuple) -> Path:
+        digest = hashlib.sha256(repr((FIGURE_CACHE_VERSION, disk_key)).encode("utf-8")).hexdigest()
+        return self.directory / f"{digest}.json"
+
+    def read(self, path: Path) -> tuple[tuple[go.Figure, ...], str] | None:
+        try:
+            text = path.read_text(encoding="utf-8")
+            return tuple(go.Figure(spec) for spec in json.loads(text)), text
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logger.warning("Figure cache file %s unreadable, rebuilding it", path.name)
+            return None
+
+    def write(self, path: Path, text: str) -> None:
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_text(text, encoding="utf-8")
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.warning("Figure cache file %s not written", path.name, exc_info=True)
+
+    # Figures under key, from memory, from disk under disk_key or from build, which returns a tuple of figures
+    def get(self, key: tuple, build, disk_key: tuple | None = None) -> tuple[go.Figure, ...]:
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.counts["hits"] += 1
+                return self.entries[key][0]
+        path = self.path(disk_key) if self.directory is not None and disk_key is not None else None
+        stored = self.read(path) if path is not None else None
+        if stored is not None:
+            (figures, text), counter = stored, "disk_hits"
+        else:
+            figures, counter = build(), "misses"
+            text = "[" + ",".join(pio.to_json(figure, validate=False) for figure in figures) + "]"
+            if path is not None:
+                self.write(path, text)
+        with self.lock:
+            self.counts[counter] += 1
+            if key not in self.entries:
+                self.entries[key] = (figures, len(text))
+                self.bytes += len(text)
+                while self.bytes > self.max_bytes and len(self.entries) > 1:
+                    _, (_, size) = self.entries.popitem(last=False)
+                    self.bytes -= size
+                    self.counts["evictions"] += 1
+            return self.entries[key][0]
+
+@st.cache_resource
+def figure_cache() -> FigureCache:
+    return FigureCache(FIGURE_CACHE_MB << 20, Path(FIGURE_CACHE_DIR) if FIGURE_CACHE_DIR else None)
+
+# For the pages: the figures build returns for section with selection, built once per selected years,
+# palette and revision of datasets. Figures that show only the rows of one member (a Gemeinde) are
+# keyed by the revision that last changed its rows and survive incremental refreshes of the others.
+def cached_figures(section: str, datasets: list[str], selection: tuple, build, member: str | None = None) -> tuple[go.Figure, ...]:
+    common = (section, selection, (start_year, end_year), tuple(custom_color_sequence), tuple(sorted(CHART_RENDER_MODE)), CHART_MAX_POINTS)
+    store = dataset_store()
+    versions = tuple(store.version(name, revisions[name]) for name in datasets)
+    disk_key = common + (versions,) if None not in versions else None
+    keys = tuple(revisions[name] if member is None else store.member_revision(name, revisions[name], member) for name in datasets)
+    return figure_cache().get(common + (keys,), build, disk_key)
+
+def cached_figure(section: str, datasets: list[str], selection: tuple, build, member: str | None = None) -> go.Figure:
+    return cached_figures(section, datasets, selection, lambda: (build(),), member)[0]
+
+
+# Background warmer
+# Started with the first session. Every WARMER_INTERVAL it lets the store refresh the datasets that are
+# due and, after a refresh, builds the cubes, row ranges and the rollups, KPIs and rankings of the
+# preselected years.
+# Users find them ready.
+
+# Last day of the month before the previous month, BFS data is published with about two months delay
+def publication_cutoff(today: datetime.date) -> datetime.date:
+    if today.month > 3:
+        return datetime.date(today.year, today.month - 3, calendar.monthrange(today.year, today.month - 3)[1])
+    else:
+        return datetime.date(today.year - 1, 12 - (3 - today.month), calendar.monthrange(today.year - 1, 12 - (3 - today.month))[1])
+
+def warm_aggregates(cache: AggregateCache, cubes: AggregateCache, frames: dict, totals: dict, revisions: dict) -> None:
+    metas = [aggregate(cache, build_meta, name, revisions[name], None, df) for name, df in frames.items() if df is not None]
+    period = default_period(metas, datetime.date.today())
+    for name, df in frames.items():
+        if df is not None:
+            cube = source_cube(cubes, name, revisions[name], df, totals[name])
+            aggregate(cache, build_rollups, name, revisions[name], period, cube.between(*period), name)
+            if name in KPI_REGIONS:
+                aggregate(cache, build_kpis, name, revisions[name], period, cube, name, period)
+            if name == "country":
+                aggregate(cache, build_ranking, name, revisions[name], period, cube.between(*period))
+            aggregate(cache, row_ranges, name, revisions[name], None, df, ROW_INDEX[name])
+
+def run_warmer(store: "DatasetStore", cache: AggregateCache, cubes: AggregateCache, figures: FigureCache) -> None:
+    warmed = logged = None
+    while True:
+        try:
+            frames, totals, revisions, _ = store.frames(LOAD_TIMEOUT)
+            state = (revisions, datetime.date.today())
+            if state != warmed:
+                started = time.monotonic()
+                warm_aggregates(cache, cubes, frames, totals, revisions)
+                logger.info("Page aggregates warmed in %.1fs (revisions %s)", time.monotonic() - started, revisions)
+                warmed = state
+            stats = figures.stats()
+            if stats != logged:
+                logger.info("Figure cache %s", stats)
+                logged = stats
+        except Exception:
+            logger.exception("Background warmer failed")
+        time.sleep(WARMER_INTERVAL)
+
+@st.cache_resource
+def cache_warmer() -> threading.Thread:
+    # Resources are looked up here, cached functions are not safe to call from the warmer thread
+    thread = threading.Thread(target=run_warmer, args=(dataset_store(), aggregate_cache(), dense_cubes(), figure_cache()),
+                              name="cache_warmer", daemon=True)
+    thread.start()
+    return thread
 
 
-    return df_country, df_kanton, df_supply #df_hotels
+# Load data
+# Datasets are loaded concurrently, each with its own deadline, schedule and error.
+def load_data() -> tuple[dict[str, pd.DataFrame | None], dict[str, pd.DataFrame | None], dict[str, int], dict[str, str]]:
+    #df_hotels = pd.read_feather(f"data/20230721_Hotels.feather")
+    cache_warmer()
+    return dataset_store().frames(LOAD_TIMEOUT)
 
-df_country, df_kanton, df_supply = load_data()
+frames, official_totals, revisions, load_errors = load_data()
+for name, message in load_errors.items():
+    if frames[name] is None:
+        st.error(f"Daten '{name}' konnten nicht geladen werden. {message}")
+    else:
+        st.warning(f"Daten '{name}' konnten nicht aktualisiert werden, angezeigt wird der letzte Stand. {message}")
+df_country, df_kanton, df_supply = frames["country"], frames["kanton"], frames["supply"]
 
 
 
@@ -553,13 +2005,8 @@ def create_main_page(df,selected_Gemeinde):
     )
 
      # Filter dataframe based on selected Gemeinde
-    filtered_df_2 = df[df['Gemeinde'] == selected_Gemeinde]
-
-    # map kantonicons to df
-    filtered_df_2.insert(0, "Kanton", filtered_df_2['Gemeinde'].map(gemeinde_kanton_mapping))
-    filtered_df_2.insert(0, "Kantonswappen", filtered_df_2['Kanton'].map(kantonswappen))
+    filtered_df_2 = region_rows("supply", df, selected_Gemeinde)
     kantonswappen_url = filtered_df_2['Kantonswappen'].iloc[0]
-    filtered_df_2.insert(0, "Gemeindewappen", filtered_df_2['Gemeinde'].map(gemeindewappen))
     gemeindewappen_url = filtered_df_2['Gemeindewappen'].iloc[0]
 
 
@@ -575,100 +2022,56 @@ def create_main_page(df,selected_Gemeinde):
     ##########
     ##########
 
+    # KPIs of the Gemeinde, see kpi_table
+    kpis = page_kpis("supply")
+    if kpis.attrs["month"] is None:
+        st.info(f"Keine Daten für den Zeitraum {start_year} - {end_year}.")
+        return
+    kpi = kpis.loc[selected_Gemeinde]
+    current_month_str = month_label(kpis.attrs["month"])
+
     # Metrics Avererges whole time
     # Format the metrics with thousand separators and no decimal places
-    average_zimmerauslastung_per_month_formatted = "{:,.0f}%".format(filtered_df_2['Zimmerauslastung in %'].mean())
-    average_zimmer_per_month_formatted = "{:,.0f}".format(filtered_df_2['Zimmer'].mean())
-    sum_logiernächte_per_month_formatted_2 = "{:,.0f}".format(filtered_df_2['Logiernächte'].sum())
-    average_zimmernaechte_per_month_formatted = "{:,.0f}".format(filtered_df_2['Zimmernächte'].mean())
-    average_betriebe_per_month_formatted = "{:,.0f}".format(filtered_df_2['Betriebe'].mean())
-    sum_ankünfte_per_month_formatted = "{:,.0f}".format(filtered_df_2['Ankünfte'].sum())
+    average_zimmerauslastung_per_month_formatted = "{:,.0f}%".format(kpi.at['Zimmerauslastung in %', 'mean'])
+    average_zimmer_per_month_formatted = "{:,.0f}".format(kpi.at['Zimmer', 'mean'])
+    sum_logiernächte_per_month_formatted_2 = "{:,.0f}".format(kpi.at['Logiernächte', 'total'])
+    average_zimmernaechte_per_month_formatted = "{:,.0f}".format(kpi.at['Zimmernächte', 'mean'])
+    average_betriebe_per_month_formatted = "{:,.0f}".format(kpi.at['Betriebe', 'mean'])
+    sum_ankünfte_per_month_formatted = "{:,.0f}".format(kpi.at['Ankünfte', 'total'])
 
-    earliest_year = filtered_df_2["Jahr"].min()
-    most_recent_year = filtered_df_2["Jahr"].max()
+    earliest_year = kpis.attrs["first"].year
+    most_recent_year = kpis.attrs["month"].year
 
     #################### Aktuelle KPIS #######################
 
-    # Dataframes last avaiable Month and same month last year
-    filtered_df_2_current_month = filtered_df_2[filtered_df_2["Date"] == first_day_actual_month]
-    filtered_df_2_current_month_last_year = filtered_df_2[filtered_df_2["Date"] == first_day_actual_month - datetime.timedelta(days=365)]
-
+    # Create the YTD period string
+    latest_month = kpis.attrs["month"]
+    ytd_period_str = f"{pd.Timestamp(latest_month.year, 1, 1).strftime('%B')} - {latest_month.strftime('%B %Y')}" # needed for KPIs
 
-    ### Ytd current year and Last year ####
-    # Calculate the start and end dates for the YTD period
-    current_year = first_day_actual_month.year
-    current_month = first_day_actual_month.month
-    start_date_ytd = datetime.date(current_year, 1, 1)
+    # Format the metrics with thousand separators and no decimal places
+    average_zimmerauslastung_current_month_formatted = "{:,.0f}%".format(kpi.at['Zimmerauslastung in %', 'month'])
+    average_zimmerauslastung_current_month_change = "{:,.0f}".format(kpi.at['Zimmerauslastung in %', 'month_diff'])
 
-    # Format the start and end dates as strings
-    start_date_str = start_date_ytd.strftime("%B")
-    end_date_str = end_date.strftime("%B %Y")
-    # Create the YTD period string
-    ytd_period_str = f"{start_date_str} - {end_date_str}" # needed for KPIs
+    average_zimmer_current_month_formatted = "{:,.0f}".format(kpi.at['Zimmer', 'month'])
+    average_zimmer_current_month_change = "{:,.0f}".format(kpi.at['Zimmer', 'month_diff'])
 
+    average_logiernächte_current_month_formatted = "{:,.0f}".format(kpi.at['Logiernächte', 'month'])
+    average_logiernächte_current_month_change = "{:,.1f}".format(kpi.at['Logiernächte', 'month_change'])
 
-    # Filter the DataFrame for the YTD period of the current year
-    filtered_df_2_ytd_current_year = filtered_df_2[
-        (filtered_df_2["Date"] >= start_date_ytd) & (filtered_df_2["Date"] <= end_date)
-    ]
+    total_logiernächte_ytd_formatted = "{:,.0f}".format(kpi.at['Logiernächte', 'ytd'])
+    total_logiernächte_ytd_change = "{:,.1f}".format(kpi.at['Logiernächte', 'ytd_change'])
 
-    # Calculate the start and end dates for the YTD period of the previous year
-    previous_year = current_year - 1
-    start_date_last_year = datetime.date(previous_year, 1, 1)
-    end_date_last_year = datetime.date(previous_year, current_month, 1)
+    average_ankünfte_current_month_formatted = "{:,.0f}".format(kpi.at['Ankünfte', 'month'])
+    average_ankünfte_current_month_change = "{:,.1f}".format(kpi.at['Ankünfte', 'month_change'])
 
-    # Filter the DataFrame for the YTD period of the previous year
-    filtered_df_2_ytd_last_year = filtered_df_2[
-        (filtered_df_2["Date"] >= start_date_last_year) & (filtered_df_2["Date"] <= end_date_last_year)
-    ]
+    total_ankünfte_ytd_formatted = "{:,.0f}".format(kpi.at['Ankünfte', 'ytd'])
+    total_ankünfte_ytd_change = "{:,.1f}".format(kpi.at['Ankünfte', 'ytd_change'])
 
-    ########
+    average_zimmernaechte_current_month_formatted = "{:,.0f}".format(kpi.at['Zimmernächte', 'month'])
+    average_zimmernaechte_current_month_change = "{:,.0f}".format(kpi.at['Zimmernächte', 'month_diff'])
 
-    def calculate_percentage_change(current_value, previous_value):
-        percentage_change = ((current_value - previous_value) / previous_value) * 100
-        return round(percentage_change, 1)
-    
-    # Format the metrics with thousand separators and no decimal places
-    average_zimmerauslastung_current_month = filtered_df_2_current_month['Zimmerauslastung in %'].mean()
-    average_zimmerauslastung_current_month_formatted = "{:,.0f}%".format(average_zimmerauslastung_current_month)
-    average_zimmerauslastung_current_month_last_year = filtered_df_2_current_month_last_year['Zimmerauslastung in %'].mean()
-    average_zimmerauslastung_current_month_change = "{:,.0f}".format(average_zimmerauslastung_current_month - average_zimmerauslastung_current_month_last_year)
-
-    average_zimmer_current_month = filtered_df_2_current_month['Zimmer'].mean()
-    average_zimmer_current_month_formatted = "{:,.0f}".format(average_zimmer_current_month)
-    average_zimmer_current_month_last_year = filtered_df_2_current_month_last_year['Zimmer'].mean()
-    average_zimmer_current_month_change = "{:,.0f}".format(average_zimmer_current_month - average_zimmer_current_month_last_year)
-
-
-    average_logiernächte_current_month = filtered_df_2_current_month['Logiernächte'].mean()
-    average_logiernächte_current_month_formatted = "{:,.0f}".format(average_logiernächte_current_month)
-    average_logiernächte_current_month_last_year = filtered_df_2_current_month_last_year['Logiernächte'].mean()
-    average_logiernächte_current_month_change = "{:,.1f}".format(calculate_percentage_change(average_logiernächte_current_month, average_logiernächte_current_month_last_year ))
-
-    total_logiernächte_ytd = filtered_df_2_ytd_current_year['Logiernächte'].sum()
-    total_logiernächte_ytd_formatted = "{:,.0f}".format(total_logiernächte_ytd)
-    total_logiernächte_currenächte_ytd_last_year = filtered_df_2_ytd_last_year['Logiernächte'].sum()
-    total_logiernächte_ytd_change = "{:,.1f}".format(calculate_percentage_change(total_logiernächte_ytd,total_logiernächte_currenächte_ytd_last_year))
-
-    average_ankünfte_current_month = filtered_df_2_current_month['Ankünfte'].mean()
-    average_ankünfte_current_month_formatted = "{:,.0f}".format(average_ankünfte_current_month)
-    average_ankünfte_current_month_last_year = filtered_df_2_current_month_last_year['Ankünfte'].mean()
-    average_ankünfte_current_month_change = "{:,.1f}".format(calculate_percentage_change(average_ankünfte_current_month, average_ankünfte_current_month_last_year ))
-
-    total_ankünfte_ytd = filtered_df_2_ytd_current_year['Ankünfte'].sum()
-    total_ankünfte_ytd_formatted = "{:,.0f}".format(total_ankünfte_ytd)
-    total_ankünfte_currenächte_ytd_last_year = filtered_df_2_ytd_last_year['Ankünfte'].sum()
-    total_ankünfte_ytd_change = "{:,.1f}".format(calculate_percentage_change(total_ankünfte_ytd,total_ankünfte_currenächte_ytd_last_year))
-
-    average_zimmernaechte_current_month = filtered_df_2_current_month['Zimmernächte'].mean()
-    average_zimmernaechte_current_month_formatted = "{:,.0f}".format(average_zimmernaechte_current_month)
-    average_zimmernaechte_current_month_last_year = filtered_df_2_current_month_last_year['Zimmernächte'].mean()
-    average_zimmernaechte_current_month_change = "{:,.0f}".format(average_zimmernaechte_current_month - average_zimmernaechte_current_month_last_year)
-
-    average_betriebe_current_month = filtered_df_2_current_month['Betriebe'].mean()
-    average_betriebe_current_month_formatted = "{:,.0f}".format(average_betriebe_current_month)
-    average_betriebe_current_month_last_year = filtered_df_2_current_month_last_year['Betriebe'].mean()
-    average_betriebe_current_month_change = "{:,.0f}".format(average_betriebe_current_month - average_betriebe_current_month_last_year)
+    average_betriebe_current_month_formatted = "{:,.0f}".format(kpi.at['Betriebe', 'month'])
+    average_betriebe_current_month_change = "{:,.0f}".format(kpi.at['Betriebe', 'month_diff'])
     
     # Create two columns for metrics and line chart
     st.header("Logiernächte & Ankünfte",
@@ -683,9 +2086,9 @@ def create_main_page(df,selected_Gemeinde):
                 help=f"Summierte Logiernächte im gesamten Zeitraum ({start_year} - {end_year})"
                 )
     
-    col2.metric(f"{str(filtered_df_2_current_month['Monat'].iloc[0])} {str(filtered_df_2_current_month['Jahr'].iloc[0])}",
+    col2.metric(f"{current_month_str}",
                 average_logiernächte_current_month_formatted,
-                help=f"Monatliche Logiernächte für {str(filtered_df_2_current_month['Monat'].iloc[0])} {str(filtered_df_2_current_month['Jahr'].iloc[0])}. Delta zeigt den Prozentualen Unterschied verglichen zur gleichen Monat im Vorjahr.",
+                help=f"Monatliche Logiernächte für {current_month_str}. Delta zeigt den Prozentualen Unterschied verglichen zur gleichen Monat im Vorjahr.",
                 delta=f"{average_logiernächte_current_month_change}%")
     
     col3.metric(ytd_period_str,
@@ -699,9 +2102,9 @@ def create_main_page(df,selected_Gemeinde):
     col1.metric(f"Ankünfte (Total)",
                 sum_ankünfte_per_month_formatted,
                 help=f"Summierte Ankünfte im gesamten Zeitraum ({start_year} - {end_year})")
-    col2.metric(f"{str(filtered_df_2_current_month['Monat'].iloc[0])} {str(filtered_df_2_current_month['Jahr'].iloc[0])}",
+    col2.metric(f"{current_month_str}",
                 average_ankünfte_current_month_formatted,
-                help=f"Monatliche Ankünfte für {str(filtered_df_2_current_month['Monat'].iloc[0])} {str(filtered_df_2_current_month['Jahr'].iloc[0])}. Delta zeigt den Prozentualen Unterschied verglichen zur gleichen Monat im Vorjahr.",
+                help=f"Monatliche Ankünfte für {current_month_str}. Delta zeigt den Prozentualen Unterschied verglichen zur gleichen Monat im Vorjahr.",
                 delta=f"{average_ankünfte_current_month_change}%"
                 )
     col3.metric(ytd_period_str,
@@ -717,19 +2120,21 @@ def create_main_page(df,selected_Gemeinde):
     selected_indicator_2 = "Ankünfte"  # Set the second indicator to "Ankünfte"
 
     # Line chart using Plotly in the first column
-    fig_line = px.line(filtered_df_2,
-                    x='Date',
-                    y=[selected_indicator_1, selected_indicator_2],  # Pass both indicators as a list
-                    title="",
-                    line_shape=line_shape,
-                    color_discrete_sequence=custom_color_sequence)  # Add colors for each indicator
-
-    fig_line.update_layout(
-        xaxis_title='',  # Hide the title of the x-axis
-        yaxis_title='',
-        legend_title_text=''  # Hide the title of the x-axis
+    def build_line():
+        fig_line = line_figure(filtered_df_2,
+                        x='Date',
+                        y=[selected_indicator_1, selected_indicator_2],  # Pass both indicators as a list
+                        line_shape=line_shape,
+                        colors=custom_color_sequence)  # Add colors for each indicator
+
+        fig_line.update_layout(
+            xaxis_title='',  # Hide the title of the x-axis
+            yaxis_title='',
+            legend_title_text=''  # Hide the title of the x-axis
 
-    )
+        )
+        return fig_line
+    fig_line = cached_figure("gemeinde/gesamtentwicklung", ["supply"], (selected_Gemeinde,), build_line, member=selected_Gemeinde)
     st.plotly_chart(fig_line,
                     use_container_width=True,
                     auto_open=False)
@@ -738,30 +2143,33 @@ def create_main_page(df,selected_Gemeinde):
 
     #### Jahresvergleich
 
-    st.subheader("Jahresvergleich")
-
-    selected_indicator_Ankünfte_Logiernächte = st.selectbox('Auswahl Kennzahl', ["Logiernächte", "Ankünfte"], index=0)
-    # Line chart using Plotly in the first column
-    fig_line = px.line(filtered_df_2,
-                    x='Monat',
-                    color='Jahr',
-                    y=selected_indicator_Ankünfte_Logiernächte,
-                    title=f"",
-                    line_shape=line_shape,
-                    color_discrete_sequence=custom_color_sequence)
-    
-    # calculate indikator mean
-    avg = filtered_df_2[selected_indicator_Ankünfte_Logiernächte].mean()
-
-    fig_line.update_layout(
-        xaxis_title='',  # Hide the title of the x-axis
-        #legend_traceorder="reversed",  # Sort the legend in descending order
-        legend_title_text=''  # Hide the title of the x-axis
-    )
-    st.plotly_chart(fig_line,
-                    use_container_width=True,
-                    auto_open=True)
-    st.caption(f"Abbildung 2: {selected_indicator_Ankünfte_Logiernächte} pro Monat in der Gemeinde {selected_Gemeinde} im Jahresvergleich")
+    # Sections with a Kennzahl of their own are fragments, a new selection reruns only that section
+    @st.fragment
+    def yearly_comparison():
+        st.subheader("Jahresvergleich")
+
+        selected_indicator_Ankünfte_Logiernächte = st.selectbox('Auswahl Kennzahl', ["Logiernächte", "Ankünfte"], index=0)
+        # Line chart using Plotly in the first column
+        def build_line():
+            fig_line = line_figure(filtered_df_2,
+                            x='Monat',
+                            color='Jahr',
+                            y=selected_indicator_Ankünfte_Logiernächte,
+                            line_shape=line_shape,
+                            colors=custom_color_sequence)
+
+            fig_line.update_layout(
+                xaxis_title='',  # Hide the title of the x-axis
+                #legend_traceorder="reversed",  # Sort the legend in descending order
+                legend_title_text=''  # Hide the title of the x-axis
+            )
+            return fig_line
+        fig_line = cached_figure("gemeinde/jahresvergleich", ["supply"], (selected_Gemeinde, selected_indicator_Ankünfte_Logiernächte), build_line, member=selected_Gemeinde)
+        st.plotly_chart(fig_line,
+                        use_container_width=True,
+                        auto_open=True)
+        st.caption(f"Abbildung 2: {selected_indicator_Ankünfte_Logiernächte} pro Monat in der Gemeinde {selected_Gemeinde} im Jahresvergleich")
+    yearly_comparison()
 
 
     st.divider()
@@ -775,9 +2183,9 @@ def create_main_page(df,selected_Gemeinde):
                 average_betriebe_per_month_formatted,
                 help=f"⌀ Anzahl der geöffneten Betriebe im ausgewählten Zeitraum ({start_year} - {end_year})"
                 )
-    col2.metric(f"{str(filtered_df_2_current_month['Monat'].iloc[0])} {str(filtered_df_2_current_month['Jahr'].iloc[0])}",
+    col2.metric(f"{current_month_str}",
                 average_betriebe_current_month_formatted,
-                help=f"Anzahl der geöffneten Betriebe im {str(filtered_df_2_current_month['Monat'].iloc[0])} {str(filtered_df_2_current_month['Jahr'].iloc[0])}. Delta zeigt die Absolute Differenz zum gleichen Monat im Vorjahr",
+                help=f"Anzahl der geöffneten Betriebe im {current_month_str}. Delta zeigt die Absolute Differenz zum gleichen Monat im Vorjahr",
                 delta=f"{average_betriebe_current_month_change}")
 
     col1, col2, col3 = st.columns(3)
@@ -785,9 +2193,9 @@ def create_main_page(df,selected_Gemeinde):
     col1.metric(f"Verfügbare Zimmer ⌀",
                 average_zimmer_per_month_formatted,
                 help=f"⌀ Anzahl der verfügbaren Zimmer im ausgewählten Zeitraum ({start_year} - {end_year})")
-    col2.metric(f"{str(filtered_df_2_current_month['Monat'].iloc[0])} {str(filtered_df_2_current_month['Jahr'].iloc[0])}",
+    col2.metric(f"{current_month_str}",
                 average_zimmer_current_month_formatted,
-                help=f"Anzahl der verfügbaren Zimmer im {str(filtered_df_2_current_month['Monat'].iloc[0])} {str(filtered_df_2_current_month['Jahr'].iloc[0])}. Delta zeigt die Absolute Differenz zum gleichen Monat im Vorjahr",
+                help=f"Anzahl der verfügbaren Zimmer im {current_month_str}. Delta zeigt die Absolute Differenz zum gleichen Monat im Vorjahr",
                 delta = f"{average_zimmer_current_month_change}"
                 )
 
@@ -799,9 +2207,9 @@ def create_main_page(df,selected_Gemeinde):
     col1.metric(f"Monatliche Zimmernächte ⌀ ",
                 average_zimmernaechte_per_month_formatted,
                 help=f"⌀ Monatliche Zimmernächte im ausgewählten Zeitraum ({start_year} - {end_year})")
-    col2.metric(f"{str(filtered_df_2_current_month['Monat'].iloc[0])} {str(filtered_df_2_current_month['Jahr'].iloc[0])}",
+    col2.metric(f"{current_month_str}",
                 average_zimmernaechte_current_month_formatted,
-                help=f"Monatliche Zimmernächte im {str(filtered_df_2_current_month['Monat'].iloc[0])} {str(filtered_df_2_current_month['Jahr'].iloc[0])}. Delta zeigt die Absolute Differenz der % Punkte zum gleichen Monat im Vorjahr",
+                help=f"Monatliche Zimmernächte im {current_month_str}. Delta zeigt die Absolute Differenz der % Punkte zum gleichen Monat im Vorjahr",
                 delta=f"{average_zimmernaechte_current_month_change}")
     
 
@@ -813,68 +2221,65 @@ def create_main_page(df,selected_Gemeinde):
                 help=f"⌀ Monatliche Zimmerauslastung im ausgewählten Zeitraum ({start_year} - {end_year})"
                 )
     
-    col2.metric(f"{str(filtered_df_2_current_month['Monat'].iloc[0])} {str(filtered_df_2_current_month['Jahr'].iloc[0])}",
+    col2.metric(f"{current_month_str}",
                 average_zimmerauslastung_current_month_formatted,
-                help=f"Monatliche Zimmerauslastung im {str(filtered_df_2_current_month['Monat'].iloc[0])} {str(filtered_df_2_current_month['Jahr'].iloc[0])}. Delta zeigt die % Differenz zum gleichen Monat im Vorjahr",
+                help=f"Monatliche Zimmerauslastung im {current_month_str}. Delta zeigt die % Differenz zum gleichen Monat im Vorjahr",
                 delta=f"{average_zimmerauslastung_current_month_change}"
                 )
 
     
 
-    selected_indicator = st.selectbox('Auswahl Kennzahl', ["Betriebe","Zimmer","Zimmernächte",'Zimmerauslastung in %'], index=0)
-
-    # Line chart using Plotly in the first column
-    st.subheader("Gesamtentwicklung")
-    fig_line = px.line(filtered_df_2,
-                    x='Date',
-                    y=selected_indicator,
-                    title="",
-                    line_shape=line_shape,
-                    color_discrete_sequence=custom_color_sequence)  # Add colors for each indicator
-
-    fig_line.update_layout(
-        xaxis_title='',  # Hide the title of the x-axis
-        yaxis_title='',
-        legend_title_text=''  # Hide the title of the x-axis
-
-    )
-    st.plotly_chart(fig_line, use_container_width=True, auto_open=False)
-    st.caption(f"Abbildung 3: {selected_indicator} pro Monat in der Gemeinde {selected_Gemeinde} von {earliest_year} - {most_recent_year}")
-
-
-    st.subheader("Jahresvergleich")
-    # Line chart using Plotly in the first column
-    fig_line = px.line(filtered_df_2,
-                    x='Monat',
-                    color='Jahr',
-                    y=selected_indicator,
-                    title=f"",
-                    line_shape=line_shape,
-                    color_discrete_sequence=custom_color_sequence)
-    # calculate indikator mean
-    avg = filtered_df_2[selected_indicator].mean()
-
-    
-    fig_line.update_layout(
-        xaxis_title='',  # Hide the title of the x-axis
-        #legend_traceorder="reversed",  # Sort the legend in descending order
-        legend_title_text=''  # Hide the title of the x-axis
-    )
-
-    st.plotly_chart(fig_line, use_container_width=True, auto_open=False)
-    st.caption(f"Abbildung 4: {selected_indicator} pro Monat in der Gemeinde {selected_Gemeinde} im Jahresvergleich")
+    @st.fragment
+    def capacity_charts():
+        selected_indicator = st.selectbox('Auswahl Kennzahl', ["Betriebe","Zimmer","Zimmernächte",'Zimmerauslastung in %'], index=0)
+
+        def build_lines():
+            # Line chart using Plotly in the first column
+            fig_line = line_figure(filtered_df_2,
+                            x='Date',
+                            y=selected_indicator,
+                            line_shape=line_shape,
+                            colors=custom_color_sequence)  # Add colors for each indicator
+
+            fig_line.update_layout(
+                xaxis_title='',  # Hide the title of the x-axis
+                yaxis_title='',
+                legend_title_text=''  # Hide the title of the x-axis
+
+            )
+
+            # Same indicator per month, one line per Jahr
+            fig_line_years = line_figure(filtered_df_2,
+                            x='Monat',
+                            color='Jahr',
+                            y=selected_indicator,
+                            line_shape=line_shape,
+                            colors=custom_color_sequence)
+
+            fig_line_years.update_layout(
+                xaxis_title='',  # Hide the title of the x-axis
+                #legend_traceorder="reversed",  # Sort the legend in descending order
+                legend_title_text=''  # Hide the title of the x-axis
+            )
+            return fig_line, fig_line_years
+        fig_line, fig_line_years = cached_figures("gemeinde/betriebe", ["supply"], (selected_Gemeinde, selected_indicator), build_lines, member=selected_Gemeinde)
+
+        st.subheader("Gesamtentwicklung")
+        st.plotly_chart(fig_line, use_container_width=True, auto_open=False)
+        st.caption(f"Abbildung 3: {selected_indicator} pro Monat in der Gemeinde {selected_Gemeinde} von {earliest_year} - {most_recent_year}")
+
+
+        st.subheader("Jahresvergleich")
+        st.plotly_chart(fig_line_years, use_container_width=True, auto_open=False)
+        st.caption(f"Abbildung 4: {selected_indicator} pro Monat in der Gemeinde {selected_Gemeinde} im Jahresvergleich")
+    capacity_charts()
     st.divider()
     st.caption("with :heart: by Datachalet")
 
 def create_other_page(df,selected_Gemeinde):
     # Filter dataframe based on selected Gemeinde
-    filtered_df = df[df['Gemeinde'] == selected_Gemeinde]
-
-    # map kantonicons to df
-    filtered_df.insert(0, "Kanton", filtered_df['Gemeinde'].map(gemeinde_kanton_mapping))
-    filtered_df.insert(0, "Kantonswappen", filtered_df['Kanton'].map(kantonswappen))
+    filtered_df = region_rows("country", df, selected_Gemeinde)
     kantonswappen_url = filtered_df['Kantonswappen'].iloc[0]
-    filtered_df.insert(0, "Gemeindewappen", filtered_df['Gemeinde'].map(gemeindewappen))
     gemeindewappen_url = filtered_df['Gemeindewappen'].iloc[0]
 
 
@@ -888,186 +2293,194 @@ def create_other_page(df,selected_Gemeinde):
     
     # Add a radio button to switch between Logiernächte and Ankünfte
     st.divider()
-    selected_indicator = st.selectbox('Auswahl Kennzahl', ["Logiernächte", "Ankünfte"], index=0)
-    st.divider()
-    st.header("Domestic vs. International")
-    st.divider()
-
-    #######
-    #######
-
-    # Determine the column for the y-axis based on the selected plot type
-    if selected_indicator == 'Logiernächte':
-        y_column = 'Logiernächte'
-    elif selected_indicator == 'Ankünfte':
-        y_column = 'Ankünfte'
-
-    # Perform grouping and aggregation
-    grouped_df = filtered_df.groupby(['Herkunftsland', 'Date']).sum().reset_index()
-    # Sort the unique values based on aggregated values in descending order
-    sorted_values = grouped_df.groupby('Herkunftsland').sum().sort_values(y_column, ascending=False).index.tolist()
-    # Create a new column to group Herkunftsländer
-    grouped_df['Herkunftsland_grouped'] = grouped_df['Herkunftsland'].apply(lambda x: x if x in sorted_values[:15] else 'Others')
-    grouped_df_no_date = grouped_df.groupby('Herkunftsland_grouped').agg({'Ankünfte': 'sum', 'Logiernächte': 'sum','Aufenthaltsdauer': 'mean'}).reset_index()
-    grouped_df_date = grouped_df.groupby(['Herkunftsland_grouped','Date']).agg({'Ankünfte': 'sum', 'Logiernächte': 'sum','Aufenthaltsdauer': 'mean'}).reset_index()
-
-    # Create two columns for metrics and line chart
-    col1, col2, col3 = st.columns([2, 0.2, 1])
-
-
-    #### Detailed top 15 Countries ########
-    fig_bar = px.bar(
-        grouped_df_no_date,
-        x='Herkunftsland_grouped',
-        y=y_column,
-        color='Herkunftsland_grouped',
-        title="",
-        color_discrete_sequence=custom_color_sequence,
-        category_orders={'Herkunftsland_grouped': sorted_values[:15] + ['Others']}  # Set custom category order
-    )
+    # The sections below show the Kennzahl selected above them, see origin_sections
+    def domestic_international_section(selected_indicator):
+        st.header("Domestic vs. International")
+        st.divider()
 
-    fig_bar.update_traces(hovertemplate='%{y}')
-    fig_bar.update_layout(
-        legend_title='Herkunftsland',
-        xaxis_title='',  # Hide the title of the x-axis
-        showlegend=False  # Remove the legend
-    )
+        #######
+        #######
 
-    # Donut Chart
-    fig_donut = px.pie(
-        grouped_df_no_date,
-        names='Herkunftsland_grouped',
-        values=y_column,
-        hole=0.5,
-        color_discrete_sequence=custom_color_sequence,
-        category_orders={'Herkunftsland_grouped': sorted_values[:15] + ['Others']}  # Set custom category order
-    )
+        # Determine the column for the y-axis based on the selected plot type
+        y_column = selected_indicator
 
-    fig_donut.update_traces(textposition='inside', textinfo='percent')
-    fig_donut.update_layout(
-        legend_title='Herkunftsland'
-    )
+        # Create two columns for metrics and line chart
+        col1, col2, col3 = st.columns([2, 0.2, 1])
 
 
-    # Time Areas Detailed
-    fig_area = px.area(
-        grouped_df_date,
-        x='Date',
-        y=y_column,
-        color='Herkunftsland_grouped',
-        line_shape=line_shape,
-        color_discrete_sequence=custom_color_sequence
-    )
-    fig_area.update_xaxes(categoryorder='array',
-                          categoryarray=sorted_values + ['Others'])
-    fig_area.update_layout(
-        legend_title='Herkunftsland'
-    )
+        def build_figures():
+            ### Grobe granularität (International und Domestic ###
 
-    ### Grobe granularität (International und Domestic ###
+            grouped_df_no_date_grob = rollup_rows(rollup("country", "Herkunftsland_grob_total"), 'Gemeinde', selected_Gemeinde)
+            grouped_df_date_grob = rollup_rows(rollup("country", "Herkunftsland_grob"), 'Gemeinde', selected_Gemeinde)
 
-    grouped_df_grob = filtered_df.groupby(['Herkunftsland_grob', 'Date']).sum().reset_index()
-    grouped_df_no_date_grob = grouped_df_grob.groupby('Herkunftsland_grob').agg({'Ankünfte': 'sum', 'Logiernächte': 'sum','Aufenthaltsdauer': 'mean'}).reset_index()
-    grouped_df_date_grob = grouped_df_grob.groupby(['Herkunftsland_grob','Date']).agg({'Ankünfte': 'sum', 'Logiernächte': 'sum','Aufenthaltsdauer': 'mean'}).reset_index()
+            # Create a dictionary mapping values to specific colors
+            fig_bar_grob = bar_figure(
+                grouped_df_no_date_grob,
+                x='Herkunftsland_grob',
+                y=y_column,
+                colors=[color1,color2]
+                )
 
-    # Create a dictionary mapping values to specific colors
-    fig_bar_grob = px.bar(
-        grouped_df_no_date_grob,
-        x='Herkunftsland_grob',
-        y=y_column,
-        color='Herkunftsland_grob',
-        title="",
-        color_discrete_sequence=[color1,color2]
+            fig_bar_grob.update_traces(
+                hovertemplate='%{y}',
+                texttemplate='%{y:,.0f}',  # Format the label to display the value with two decimal places
+                textposition='auto'
+            )
+
+            fig_bar_grob.update_layout(
+                legend_title='Herkunftsland',
+                xaxis_title='',  # Hide the title of the x-axis
+                showlegend=False  # Remove the legend
+            )
+
+            # Donut Chart
+            color_map = {'International': color2, 'Domestic': color1}
+
+            fig_donut_grob = pie_figure(
+                grouped_df_no_date_grob,
+                names='Herkunftsland_grob',
+                values=y_column,
+                hole=0.5,
+                colors=[color_map[value] for value in grouped_df_no_date_grob['Herkunftsland_grob']]
+            )
+
+            fig_donut_grob.update_traces(textposition='inside', textinfo='percent')
+            fig_donut_grob.update_layout(
+                legend_title='Herkunftsland'
+            )
+
+            # Time Areas grob
+            fig_area_grob = line_figure(
+                grouped_df_date_grob ,
+                x='Date',
+                y=y_column,
+                line_shape=line_shape,
+                color='Herkunftsland_grob',
+                colors=[color1,color2],
+                stacked=True
+            )
+            fig_area_grob.update_layout(
+            legend_title='Herkunftsland',
+            legend_traceorder='reversed'  # Reverse the order of the legend
+            )
+            return fig_bar_grob, fig_donut_grob, fig_area_grob
+        fig_bar_grob, fig_donut_grob, fig_area_grob = cached_figures(
+            "gemeinde/domestic_international", ["country"], (selected_Gemeinde, y_column), build_figures, member=selected_Gemeinde)
+
+        col1, col2 = st.columns(2)
+        col1.plotly_chart(fig_bar_grob, use_container_width=True, auto_open=False)
+        col2.plotly_chart(fig_donut_grob, use_container_width=True, auto_open=False)
+        st.caption(f"Abbildung 1: {selected_indicator} für die Gemeinde {selected_Gemeinde} (Zeitraum {start_year} - {end_year})")
+        st.plotly_chart(fig_area_grob, use_container_width=True, auto_open=False)
+        st.caption(f"Abbildung 2: {selected_indicator} pro Monat in der Gemeinde {selected_Gemeinde} von {start_year} - {end_year} nach Herkunftsland")
+
+    def top_herkunftslaender_section(selected_indicator):
+        st.header("Top 15 Herkunftsländer")
+        st.divider()
+        y_column = selected_indicator
+
+        def build_figures():
+            # Herkunftsländer sorted by their total in descending order, the top 15 and the others together
+            ranking = origin_ranking()
+            sorted_values = ranking.ranked(selected_Gemeinde, y_column)
+            grouped_df_no_date, grouped_df_date = ranking.top(selected_Gemeinde, y_column, TOP_ORIGINS)
+
+            #### Detailed top 15 Countries ########
+            fig_bar = bar_figure(
+                grouped_df_no_date,
+                x='Herkunftsland_grouped',
+                y=y_column,
+                colors=custom_color_sequence,
+                order=sorted_values[:TOP_ORIGINS] + [OTHERS]  # Set custom category order
+            )
+
+            fig_bar.update_traces(hovertemplate='%{y}')
+            fig_bar.update_layout(
+                legend_title='Herkunftsland',
+                xaxis_title='',  # Hide the title of the x-axis
+                showlegend=False  # Remove the legend
+            )
+
+            # Donut Chart
+            fig_donut = pie_figure(
+                grouped_df_no_date,
+                names='Herkunftsland_grouped',
+                values=y_column,
+                hole=0.5,
+                colors=custom_color_sequence,
+                order=sorted_values[:TOP_ORIGINS] + [OTHERS]  # Set custom category order
+            )
+
+            fig_donut.update_traces(textposition='inside', textinfo='percent')
+            fig_donut.update_layout(
+                legend_title='Herkunftsland'
+            )
+
+
+            # Time Areas Detailed
+            fig_area = line_figure(
+                grouped_df_date,
+                x='Date',
+                y=y_column,
+                color='Herkunftsland_grouped',
+                line_shape=line_shape,
+                colors=custom_color_sequence,
+                stacked=True
+            )
+            fig_area.update_xaxes(categoryorder='array',
+                                  categoryarray=sorted_values + [OTHERS])
+            fig_area.update_layout(
+                legend_title='Herkunftsland'
+            )
+            return fig_bar, fig_donut, fig_area
+        fig_bar, fig_donut, fig_area = cached_figures(
+            "gemeinde/top_herkunftslaender", ["country"], (selected_Gemeinde, y_column), build_figures, member=selected_Gemeinde)
+
+        st.plotly_chart(fig_bar, use_container_width=True, auto_open=False)
+        st.caption(f"Abbildung 3: {selected_indicator} für die Gemeinde {selected_Gemeinde} nach Herkunftsland Absolut (Zeitraum {start_year} - {end_year})")
+        st.plotly_chart(fig_donut, use_container_width=True, auto_open=False)
+        st.caption(f"Abbildung 4: {selected_indicator} für die Gemeinde {selected_Gemeinde} nach Herkunftsland in % (Zeitraum {start_year} - {end_year})")
+        st.plotly_chart(fig_area, use_container_width=True, auto_open=False)
+        st.caption(f"Abbildung 5: {selected_indicator} pro Monat in der Gemeinde {selected_Gemeinde} von {start_year} - {end_year} nach Herkunftsland")
+
+
+        # Herkunftsland Dataframe
+        grouped_df_Herkunftsland = rollup_rows(rollup("country", "Herkunftsland"), 'Gemeinde', selected_Gemeinde)[['Herkunftsland', selected_indicator, f"{selected_indicator} Total", f"{selected_indicator} Anteil"]]
+        grouped_df_Herkunftsland = grouped_df_Herkunftsland.sort_values(f"{selected_indicator} Total",ascending=False)
+        grouped_df_Herkunftsland.insert(0, "Flagge", grouped_df_Herkunftsland['Herkunftsland'].map(countryflags))
+
+
+        st.dataframe(
+            grouped_df_Herkunftsland,
+            column_config={
+                "Flagge": st.column_config.ImageColumn("Flagge"),
+                "Herkunftsland": "Herkunftsland",
+                selected_indicator: st.column_config.LineChartColumn(
+                    selected_indicator),
+                f"{selected_indicator} Anteil":st.column_config.ProgressColumn(
+            f"{selected_indicator} Anteil",
+                help="% zum Gesamtmarkt",
+                format="%.2f%%",
+                min_value=0,
+                max_value=100,
+            ),
+
+            },
+            hide_index=True,
+            use_container_width = True
         )
+        st.caption(f"Abbildung 6: {selected_indicator} für die Gemeinde {selected_Gemeinde} von {start_year} - {end_year} nach Herkunftsland")
 
-    fig_bar_grob.update_traces(
-        hovertemplate='%{y}',
-        texttemplate='%{y:,.0f}',  # Format the label to display the value with two decimal places
-        textposition='auto'
-    )
-
-    fig_bar_grob.update_layout(
-        legend_title='Herkunftsland',
-        xaxis_title='',  # Hide the title of the x-axis
-        showlegend=False  # Remove the legend
-    )
-
-    # Donut Chart
-    color_map = {'International': color2, 'Domestic': color1}
-
-    fig_donut_grob = px.pie(
-        grouped_df_no_date_grob,
-        names='Herkunftsland_grob',
-        values=y_column,
-        hole=0.5,
-        color_discrete_sequence=[color_map[value] for value in grouped_df_no_date_grob['Herkunftsland_grob']]
-    )
-
-    fig_donut_grob.update_traces(textposition='inside', textinfo='percent')
-    fig_donut_grob.update_layout(
-        legend_title='Herkunftsland'
-    )
-
-    # Time Areas grob
-    fig_area_grob = px.area(
-        grouped_df_date_grob ,
-        x='Date',
-        y=y_column,
-        line_shape=line_shape,
-        color='Herkunftsland_grob',
-        color_discrete_sequence=[color1,color2]
-    )
-    fig_area_grob.update_layout(
-    legend_title='Herkunftsland',
-    legend_traceorder='reversed'  # Reverse the order of the legend
-    )
-    
-    col1, col2 = st.columns(2)
-    col1.plotly_chart(fig_bar_grob, use_container_width=True, auto_open=False)
-    col2.plotly_chart(fig_donut_grob, use_container_width=True, auto_open=False)
-    st.caption(f"Abbildung 1: {selected_indicator} für die Gemeinde {selected_Gemeinde} (Zeitraum {start_year} - {end_year})")
-    st.plotly_chart(fig_area_grob, use_container_width=True, auto_open=False)
-    st.caption(f"Abbildung 2: {selected_indicator} pro Monat in der Gemeinde {selected_Gemeinde} von {start_year} - {end_year} nach Herkunftsland")
-
-    st.divider()
-    st.header("Top 15 Herkunftsländer")
-    st.divider()
-    st.plotly_chart(fig_bar, use_container_width=True, auto_open=False)
-    st.caption(f"Abbildung 3: {selected_indicator} für die Gemeinde {selected_Gemeinde} nach Herkunftsland Absolut (Zeitraum {start_year} - {end_year})")
-    st.plotly_chart(fig_donut, use_container_width=True, auto_open=False)
-    st.caption(f"Abbildung 4: {selected_indicator} für die Gemeinde {selected_Gemeinde} nach Herkunftsland in % (Zeitraum {start_year} - {end_year})")
-    st.plotly_chart(fig_area, use_container_width=True, auto_open=False)
-    st.caption(f"Abbildung 5: {selected_indicator} pro Monat in der Gemeinde {selected_Gemeinde} von {start_year} - {end_year} nach Herkunftsland")
-
-
-    # Herkunftsland Dataframe
-    grouped_df_Herkunftsland = filtered_df.groupby(['Date','Monat','Jahr','Herkunftsland']).agg({selected_indicator: 'sum'}).reset_index()
-    grouped_df_Herkunftsland = grouped_df_Herkunftsland.groupby('Herkunftsland').agg({selected_indicator: list}).reset_index()
-    grouped_df_Herkunftsland[f"{selected_indicator} Total"] = grouped_df_Herkunftsland[selected_indicator].apply(lambda x: sum(x))
-    grouped_df_Herkunftsland[f"{selected_indicator} Anteil"] = ((100 / sum(grouped_df_Herkunftsland[f"{selected_indicator} Total"])) * grouped_df_Herkunftsland[f"{selected_indicator} Total"]).apply(lambda x: f"{x:.2f}%")
-    grouped_df_Herkunftsland.insert(0, "Flagge", grouped_df_Herkunftsland['Herkunftsland'].map(countryflags))
-    grouped_df_Herkunftsland = grouped_df_Herkunftsland.sort_values(f"{selected_indicator} Total",ascending=False)
-
-
-    st.dataframe(
-        grouped_df_Herkunftsland,
-        column_config={
-            "Flagge": st.column_config.ImageColumn("Flagge"),
-            "Herkunftsland": "Herkunftsland",
-            selected_indicator: st.column_config.LineChartColumn(
-                selected_indicator),
-            f"{selected_indicator} Anteil":st.column_config.ProgressColumn(
-        f"{selected_indicator} Anteil",
-            help="% zum Gesamtmarkt",
-            min_value=0,
-            max_value=1,
-        ),
-
-        },
-        hide_index=True,
-        use_container_width = True
-    )
-    st.caption(f"Abbildung 6: {selected_indicator} für die Gemeinde {selected_Gemeinde} von {start_year} - {end_year} nach Herkunftsland")
+    # The Kennzahl drives every section below, a new selection reruns them as one fragment
+    @st.fragment
+    def origin_sections():
+        selected_indicator = st.selectbox('Auswahl Kennzahl', ["Logiernächte", "Ankünfte"], index=0)
+        st.divider()
+        domestic_international_section(selected_indicator)
+        st.divider()
+        top_herkunftslaender_section(selected_indicator)
+    origin_sections()
 
 
     # Download CSV
@@ -1082,7 +2495,7 @@ def create_other_page(df,selected_Gemeinde):
     st.caption("with :heart: by Datachalet")
 
 
-def create_markt_page(df,df_gemeinde):
+def create_markt_page():
     
     swissflag_url = "https://raw.githubusercontent.com/thenotsowhiterabbit/hotelstats/master/images/countryicons/switzerland.svg"
 
@@ -1092,77 +2505,40 @@ def create_markt_page(df,df_gemeinde):
         unsafe_allow_html=True
     )
 
-    df = df.sort_values('Date')
-    df_gemeinde = df_gemeinde.sort_values('Date')
+    # KPIs of Switzerland, see kpi_table
+    kpis = page_kpis("kanton")
+    if kpis.attrs["month"] is None:
+        st.info(f"Keine Daten für den Zeitraum {start_year} - {end_year}.")
+        return
+    kpi = kpis.loc[NATIONAL]
+    current_month_str = month_label(kpis.attrs["month"])
 
     # Metrics Avererges whole time
     # Format the metrics with thousand separators and no decimal places
-    sum_logiernächte_per_month_formatted_2 = "{:,.0f}".format(df['Logiernächte'].sum())
-    sum_ankünfte_per_month_formatted = "{:,.0f}".format(df['Ankünfte'].sum())
+    sum_logiernächte_per_month_formatted_2 = "{:,.0f}".format(kpi.at['Logiernächte', 'total'])
+    sum_ankünfte_per_month_formatted = "{:,.0f}".format(kpi.at['Ankünfte', 'total'])
 
-    earliest_year = df["Jahr"].min()
-    most_recent_year = df["Jahr"].max()
+    earliest_year = kpis.attrs["first"].year
+    most_recent_year = kpis.attrs["month"].year
 
     #################### Aktuelle KPIS #######################
 
-    # Dataframes last avaiable Month and same month last year
-    filtered_df_2_current_month = df[df["Date"] == first_day_actual_month]
-    filtered_df_2_current_month_last_year = df[df["Date"] == first_day_actual_month - datetime.timedelta(days=365)]
-
-    ### Ytd current year and Last year ####
-    # Calculate the start and end dates for the YTD period
-    current_year = first_day_actual_month.year
-    current_month = first_day_actual_month.month
-    start_date_ytd = datetime.date(current_year, 1, 1)
-
-    # Format the start and end dates as strings
-    start_date_str = start_date_ytd.strftime("%B")
-    end_date_str = end_date.strftime("%B %Y")
     # Create the YTD period string
-    ytd_period_str = f"{start_date_str} - {end_date_str}" # needed for KPIs
-
+    latest_month = kpis.attrs["month"]
+    ytd_period_str = f"{pd.Timestamp(latest_month.year, 1, 1).strftime('%B')} - {latest_month.strftime('%B %Y')}" # needed for KPIs
 
-    # Filter the DataFrame for the YTD period of the current year
-    filtered_df_2_ytd_current_year = df[
-        (df["Date"] >= start_date_ytd) & (df["Date"] <= end_date)
-    ]
+    # Format the metrics with thousand separators and no decimal places
+    average_logiernächte_current_month_formatted = "{:,.0f}".format(kpi.at['Logiernächte', 'month'])
+    average_logiernächte_current_month_change = "{:,.1f}".format(kpi.at['Logiernächte', 'month_change'])
 
-    # Calculate the start and end dates for the YTD period of the previous year
-    previous_year = current_year - 1
-    start_date_last_year = datetime.date(previous_year, 1, 1)
-    end_date_last_year = datetime.date(previous_year, current_month, 1)
+    total_logiernächte_ytd_formatted = "{:,.0f}".format(kpi.at['Logiernächte', 'ytd'])
+    total_logiernächte_ytd_change = "{:,.1f}".format(kpi.at['Logiernächte', 'ytd_change'])
 
-    # Filter the DataFrame for the YTD period of the previous year
-    filtered_df_2_ytd_last_year = df[
-        (df["Date"] >= start_date_last_year) & (df["Date"] <= end_date_last_year)
-    ]
+    average_ankünfte_current_month_formatted = "{:,.0f}".format(kpi.at['Ankünfte', 'month'])
+    average_ankünfte_current_month_change = "{:,.1f}".format(kpi.at['Ankünfte', 'month_change'])
 
-    ########
-
-    def calculate_percentage_change(current_value, previous_value):
-        percentage_change = ((current_value - previous_value) / previous_value) * 100
-        return round(percentage_change, 1)
-    
-    # Format the metrics with thousand separators and no decimal places
-    average_logiernächte_current_month = filtered_df_2_current_month['Logiernächte'].sum()
-    average_logiernächte_current_month_formatted = "{:,.0f}".format(average_logiernächte_current_month)
-    average_logiernächte_current_month_last_year = filtered_df_2_current_month_last_year['Logiernächte'].sum()
-    average_logiernächte_current_month_change = "{:,.1f}".format(calculate_percentage_change(average_logiernächte_current_month, average_logiernächte_current_month_last_year ))
-
-    total_logiernächte_ytd = filtered_df_2_ytd_current_year['Logiernächte'].sum()
-    total_logiernächte_ytd_formatted = "{:,.0f}".format(total_logiernächte_ytd)
-    total_logiernächte_currenächte_ytd_last_year = filtered_df_2_ytd_last_year['Logiernächte'].sum()
-    total_logiernächte_ytd_change = "{:,.1f}".format(calculate_percentage_change(total_logiernächte_ytd,total_logiernächte_currenächte_ytd_last_year))
-
-    average_ankünfte_current_month = filtered_df_2_current_month['Ankünfte'].sum()
-    average_ankünfte_current_month_formatted = "{:,.0f}".format(average_ankünfte_current_month)
-    average_ankünfte_current_month_last_year = filtered_df_2_current_month_last_year['Ankünfte'].sum()
-    average_ankünfte_current_month_change = "{:,.1f}".format(calculate_percentage_change(average_ankünfte_current_month, average_ankünfte_current_month_last_year))
-
-    total_ankünfte_ytd = filtered_df_2_ytd_current_year['Ankünfte'].sum()
-    total_ankünfte_ytd_formatted = "{:,.0f}".format(total_ankünfte_ytd)
-    total_ankünfte_currenächte_ytd_last_year = filtered_df_2_ytd_last_year['Ankünfte'].sum()
-    total_ankünfte_ytd_change = "{:,.1f}".format(calculate_percentage_change(total_ankünfte_ytd,total_ankünfte_currenächte_ytd_last_year))
+    total_ankünfte_ytd_formatted = "{:,.0f}".format(kpi.at['Ankünfte', 'ytd'])
+    total_ankünfte_ytd_change = "{:,.1f}".format(kpi.at['Ankünfte', 'ytd_change'])
 
     # Create two columns for metrics and line chart
     st.divider()
@@ -1178,9 +2554,9 @@ def create_markt_page(df,df_gemeinde):
                 help=f"Summierte Logiernächte im gesamten Zeitraum ({start_year} - {end_year})"
                 )
     
-    col2.metric(f"{str(filtered_df_2_current_month['Monat'].iloc[0])} {str(filtered_df_2_current_month['Jahr'].iloc[0])}",
+    col2.metric(f"{current_month_str}",
                 average_logiernächte_current_month_formatted,
-                help=f"Monatliche Logiernächte für {str(filtered_df_2_current_month['Monat'].iloc[0])} {str(filtered_df_2_current_month['Jahr'].iloc[0])}. Delta zeigt den Prozentualen Unterschied verglichen zur gleichen Monat im Vorjahr.",
+                help=f"Monatliche Logiernächte für {current_month_str}. Delta zeigt den Prozentualen Unterschied verglichen zur gleichen Monat im Vorjahr.",
                 delta=f"{average_logiernächte_current_month_change}%")
     
     col3.metric(ytd_period_str,
@@ -1194,9 +2570,9 @@ def create_markt_page(df,df_gemeinde):
     col1.metric(f"Ankünfte (Total)",
                 sum_ankünfte_per_month_formatted,
                 help=f"Summierte Ankünfte im gesamten Zeitraum ({start_year} - {end_year})")
-    col2.metric(f"{str(filtered_df_2_current_month['Monat'].iloc[0])} {str(filtered_df_2_current_month['Jahr'].iloc[0])}",
+    col2.metric(f"{current_month_str}",
                 average_ankünfte_current_month_formatted,
-                help=f"Monatliche Ankünfte für {str(filtered_df_2_current_month['Monat'].iloc[0])} {str(filtered_df_2_current_month['Jahr'].iloc[0])}. Delta zeigt den Prozentualen Unterschied verglichen zur gleichen Monat im Vorjahr.",
+                help=f"Monatliche Ankünfte für {current_month_str}. Delta zeigt den Prozentualen Unterschied verglichen zur gleichen Monat im Vorjahr.",
                 delta=f"{average_ankünfte_current_month_change}%"
                 )
     col3.metric(ytd_period_str,
@@ -1210,115 +2586,116 @@ def create_markt_page(df,df_gemeinde):
     selected_indicator_1 = "Logiernächte"  # Set the selected indicator to "Logiernächte"
     selected_indicator_2 = "Ankünfte"  # Set the second indicator to "Ankünfte"
 
-    grouped_df = df.groupby('Date').agg({'Ankünfte': 'sum', 'Logiernächte': 'sum','Aufenthaltsdauer': 'mean'}).reset_index()
-
     # Line chart using Plotly in the first column
-    fig_line = px.line(grouped_df,
-                    x='Date',
-                    y=[selected_indicator_1, selected_indicator_2],  # Pass both indicators as a list
-                    title="",
-                    line_shape=line_shape,
-                    color_discrete_sequence=custom_color_sequence)  # Add colors for each indicator
-
-    fig_line.update_layout(
-        xaxis_title='',  # Hide the title of the x-axis
-        yaxis_title='',
-        legend_title_text=''  # Hide the title of the x-axis
+    def build_line():
+        grouped_df = rollup("kanton", "Date")
+        fig_line = line_figure(grouped_df,
+                        x='Date',
+                        y=[selected_indicator_1, selected_indicator_2],  # Pass both indicators as a list
+                        line_shape=line_shape,
+                        colors=custom_color_sequence)  # Add colors for each indicator
+
+        fig_line.update_layout(
+            xaxis_title='',  # Hide the title of the x-axis
+            yaxis_title='',
+            legend_title_text=''  # Hide the title of the x-axis
 
-    )
+        )
+        return fig_line
+    fig_line = cached_figure("markt/gesamtentwicklung", ["kanton"], (), build_line)
     st.plotly_chart(fig_line, use_container_width=True, auto_open=False)
     st.caption(f"Abbildung 1: {selected_indicator_1} und {selected_indicator_2} pro Monat von {earliest_year} - {most_recent_year}")
 
 
     #### Jahresvergleich
 
-    st.subheader("Jahresvergleich")
+    # Each section with its own Kennzahl reruns alone as a fragment
+    @st.fragment
+    def yearly_comparison():
+        st.subheader("Jahresvergleich")
 
-    selected_indicator_Ankünfte_Logiernächte = st.selectbox('Auswahl Kennzahl', ["Logiernächte", "Ankünfte"], index=0, key='selected_indicator_Ankünfte_Logiernächte')
-    grouped_df_2 = df.groupby(['Date','Monat','Jahr']).agg({'Ankünfte': 'sum', 'Logiernächte': 'sum','Aufenthaltsdauer': 'mean'}).reset_index()
-    grouped_df_2 = grouped_df_2.sort_values('Date')
+        selected_indicator_Ankünfte_Logiernächte = st.selectbox('Auswahl Kennzahl', ["Logiernächte", "Ankünfte"], index=0, key='selected_indicator_Ankünfte_Logiernächte')
 
+        # Line chart using Plotly in the first column
+        def build_line():
+            grouped_df_2 = rollup("kanton", "Date")
+            fig_line = line_figure(grouped_df_2,
+                            x='Monat',
+                            color='Jahr',
+                            y=selected_indicator_Ankünfte_Logiernächte,
+                            line_shape=line_shape,
+                            colors=custom_color_sequence)
 
-    # Line chart using Plotly in the first column
-    fig_line = px.line(grouped_df_2,
-                    x='Monat',
-                    color='Jahr',
-                    y=selected_indicator_Ankünfte_Logiernächte,
-                    title=f"",
-                    line_shape=line_shape,
-                    color_discrete_sequence=custom_color_sequence)
-    
-    # calculate indikator mean
-    avg = df[selected_indicator_Ankünfte_Logiernächte].mean()
-
-    fig_line.update_layout(
-        xaxis_title='',  # Hide the title of the x-axis
-        #legend_traceorder="reversed",  # Sort the legend in descending order
-        legend_title_text=''  # Hide the title of the x-axis
-    )
-    st.plotly_chart(fig_line, use_container_width=True, auto_open=True)
-    st.caption(f"Abbildung 2: {selected_indicator_Ankünfte_Logiernächte} pro Monat im Jahresvergleich von {earliest_year} - {most_recent_year}")
+            fig_line.update_layout(
+                xaxis_title='',  # Hide the title of the x-axis
+                #legend_traceorder="reversed",  # Sort the legend in descending order
+                legend_title_text=''  # Hide the title of the x-axis
+            )
+            return fig_line
+        fig_line = cached_figure("markt/jahresvergleich", ["kanton"], (selected_indicator_Ankünfte_Logiernächte,), build_line)
+        st.plotly_chart(fig_line, use_container_width=True, auto_open=True)
+        st.caption(f"Abbildung 2: {selected_indicator_Ankünfte_Logiernächte} pro Monat im Jahresvergleich von {earliest_year} - {most_recent_year}")
+    yearly_comparison()
 
 
 
     # Kantons Dataframe
-    st.subheader("Entwicklung Kantone")
-    selected_indicator_Ankünfte_Logiernächte_2 = st.selectbox('Auswahl Kennzahl', ["Logiernächte", "Ankünfte"], index=0,key='selected_indicator_Ankünfte_Logiernächte_2')
-    grouped_df_kanton = df.groupby(['Date','Monat','Jahr','Kanton']).agg({selected_indicator_Ankünfte_Logiernächte_2: 'sum'}).reset_index()
-    grouped_df_kanton = grouped_df_kanton.groupby('Kanton').agg({selected_indicator_Ankünfte_Logiernächte_2: list}).reset_index()
-    grouped_df_kanton[f"{selected_indicator_Ankünfte_Logiernächte_2} Total"] = grouped_df_kanton[selected_indicator_Ankünfte_Logiernächte_2].apply(lambda x: sum(x))
-    grouped_df_kanton[f"{selected_indicator_Ankünfte_Logiernächte_2} Anteil"] = ((100 / sum(grouped_df_kanton[f"{selected_indicator_Ankünfte_Logiernächte_2} Total"])) * grouped_df_kanton[f"{selected_indicator_Ankünfte_Logiernächte_2} Total"]).apply(lambda x: f"{x:.2f}%")
-    grouped_df_kanton.insert(0, "Wappen", grouped_df_kanton['Kanton'].map(kantonswappen))
-    grouped_df_kanton = grouped_df_kanton.sort_values(f"{selected_indicator_Ankünfte_Logiernächte_2} Total",ascending=False)
-
-    st.dataframe(
-        grouped_df_kanton,
-        column_config={
-            "Wappen": st.column_config.ImageColumn("Wappen"),
-            "Kanton": "Kanton",
-            selected_indicator_Ankünfte_Logiernächte_2: st.column_config.LineChartColumn(
-                selected_indicator_Ankünfte_Logiernächte_2),
-            f"{selected_indicator_Ankünfte_Logiernächte_2} Anteil":st.column_config.ProgressColumn(
-        f"{selected_indicator_Ankünfte_Logiernächte_2} Anteil",
-            help="% zum Gesamtmarkt",
-            min_value=0,
-            max_value=1,
-        ),
-                },
-        hide_index=True,
-        use_container_width = True
-    )
-    st.caption(f"Abbildung 3: {selected_indicator_Ankünfte_Logiernächte} nach Kanton von {earliest_year} - {most_recent_year}")
-
-    #Gemeinde Dataframe
-    st.subheader("Entwicklung Gemeinden")
-    grouped_df_gemeinde = df_gemeinde.groupby(['Date','Monat','Jahr','Gemeinde']).agg({selected_indicator_Ankünfte_Logiernächte_2: 'sum'}).reset_index()
-    grouped_df_gemeinde = grouped_df_gemeinde.groupby('Gemeinde').agg({selected_indicator_Ankünfte_Logiernächte_2: list}).reset_index()
-    grouped_df_gemeinde[f"{selected_indicator_Ankünfte_Logiernächte_2} Total"] = grouped_df_gemeinde[selected_indicator_Ankünfte_Logiernächte_2].apply(lambda x: sum(x))
-    grouped_df_kanton[f"{selected_indicator_Ankünfte_Logiernächte_2} Anteil"] = ((100 / sum(grouped_df_gemeinde[f"{selected_indicator_Ankünfte_Logiernächte_2} Total"])) * grouped_df_gemeinde[f"{selected_indicator_Ankünfte_Logiernächte_2} Total"]).apply(lambda x: f"{x:.2f}%")
-    grouped_df_gemeinde.insert(0, "Wappen", grouped_df_gemeinde['Gemeinde'].map(gemeindewappen))
-    grouped_df_gemeinde = grouped_df_gemeinde.sort_values(f"{selected_indicator_Ankünfte_Logiernächte_2} Total",ascending=False)
-
-
-    st.dataframe(
-        grouped_df_gemeinde,
-        column_config={
-            "Wappen": st.column_config.ImageColumn("Wappen"),
-            "Gemeinde": "Gemeinde",
-            selected_indicator_Ankünfte_Logiernächte_2: st.column_config.LineChartColumn(
-                selected_indicator_Ankünfte_Logiernächte_2),
-            f"{selected_indicator_Ankünfte_Logiernächte_2} Anteil":st.column_config.ProgressColumn(
-        f"{selected_indicator_Ankünfte_Logiernächte_2} Anteil",
-            help="% zum Gesamtmarkt",
-            min_value=0,
-            max_value=1,
-        ),
-                },
-        hide_index=True,
-        use_container_width = True
-    )
+    @st.fragment
+    def region_tables():
+        st.subheader("Entwicklung Kantone")
+        selected_indicator_Ankünfte_Logiernächte_2 = st.selectbox('Auswahl Kennzahl', ["Logiernächte", "Ankünfte"], index=0,key='selected_indicator_Ankünfte_Logiernächte_2')
+        grouped_df_kanton = rollup("kanton", "Kanton")[['Kanton', selected_indicator_Ankünfte_Logiernächte_2, f"{selected_indicator_Ankünfte_Logiernächte_2} Total", f"{selected_indicator_Ankünfte_Logiernächte_2} Anteil"]]
+        grouped_df_kanton = grouped_df_kanton.sort_values(f"{selected_indicator_Ankünfte_Logiernächte_2} Total",ascending=False)
+        grouped_df_kanton.insert(0, "Wappen", grouped_df_kanton['Kanton'].map(kantonswappen))
+
+        st.dataframe(
+            grouped_df_kanton,
+            column_config={
+                "Wappen": st.column_config.ImageColumn("Wappen"),
+                "Kanton": "Kanton",
+                selected_indicator_Ankünfte_Logiernächte_2: st.column_config.LineChartColumn(
+                    selected_indicator_Ankünfte_Logiernächte_2),
+                f"{selected_indicator_Ankünfte_Logiernächte_2} Anteil":st.column_config.ProgressColumn(
+            f"{selected_indicator_Ankünfte_Logiernächte_2} Anteil",
+                help="% zum Gesamtmarkt",
+                format="%.2f%%",
+                min_value=0,
+                max_value=100,
+            ),
+                    },
+            hide_index=True,
+            use_container_width = True
+        )
+        st.caption(f"Abbildung 3: {selected_indicator_Ankünfte_Logiernächte_2} nach Kanton von {earliest_year} - {most_recent_year}")
+
+        #Gemeinde Dataframe
+        st.subheader("Entwicklung Gemeinden")
+        grouped_df_gemeinde = rollup("supply", "Gemeinde")[['Gemeinde', selected_indicator_Ankünfte_Logiernächte_2, f"{selected_indicator_Ankünfte_Logiernächte_2} Total", f"{selected_indicator_Ankünfte_Logiernächte_2} Anteil"]]
+        grouped_df_gemeinde = grouped_df_gemeinde.sort_values(f"{selected_indicator_Ankünfte_Logiernächte_2} Total",ascending=False)
+        grouped_df_gemeinde.insert(0, "Wappen", grouped_df_gemeinde['Gemeinde'].map(gemeindewappen))
+
+
+        st.dataframe(
+            grouped_df_gemeinde,
+            column_config={
+                "Wappen": st.column_config.ImageColumn("Wappen"),
+                "Gemeinde": "Gemeinde",
+                selected_indicator_Ankünfte_Logiernächte_2: st.column_config.LineChartColumn(
+                    selected_indicator_Ankünfte_Logiernächte_2),
+                f"{selected_indicator_Ankünfte_Logiernächte_2} Anteil":st.column_config.ProgressColumn(
+            f"{selected_indicator_Ankünfte_Logiernächte_2} Anteil",
+                help="% zum Gesamtmarkt",
+                format="%.2f%%",
+                min_value=0,
+                max_value=100,
+            ),
+                    },
+            hide_index=True,
+            use_container_width = True
+        )
 
-    st.caption(f"Abbildung 4: {selected_indicator_Ankünfte_Logiernächte} nach Gemeinde von {earliest_year} - {most_recent_year}")
+        st.caption(f"Abbildung 4: {selected_indicator_Ankünfte_Logiernächte_2} nach Gemeinde von {earliest_year} - {most_recent_year}")
+    region_tables()
 
 
 
@@ -1326,82 +2703,83 @@ def create_markt_page(df,df_gemeinde):
 
 
     ##### Herkunftsland Map ####
-    st.subheader("Entwicklung nach Herkunftsland")
-    selected_indicator_Ankünfte_Logiernächte_3 = st.selectbox('Auswahl Kennzahl', ["Logiernächte", "Ankünfte"], index=0,key='selected_indicator_Ankünfte_Logiernächte_3')
+    @st.fragment
+    def origin_table():
+        st.subheader("Entwicklung nach Herkunftsland")
+        selected_indicator_Ankünfte_Logiernächte_3 = st.selectbox('Auswahl Kennzahl', ["Logiernächte", "Ankünfte"], index=0,key='selected_indicator_Ankünfte_Logiernächte_3')
 
 
-    # Add ISO codes to the country data
-    country_totals = df.groupby('Herkunftsland')[selected_indicator_Ankünfte_Logiernächte_3].sum().reset_index()
+        # Add ISO codes to the country data
+        country_totals = rollup("kanton", "Herkunftsland_total")[['Herkunftsland', selected_indicator_Ankünfte_Logiernächte_3]].copy()
 
 
-    iso_codes = []
-    for country in country_totals['Herkunftsland']:
-        iso_code = country_mapping.get(country)
-        iso_codes.append(iso_code)
+        iso_codes = []
+        for country in country_totals['Herkunftsland']:
+            iso_code = country_mapping.get(country)
+            iso_codes.append(iso_code)
 
-    country_totals['ISO_Code'] = iso_codes
-    # Drop Switzerland from the dataframe
-    country_totals = country_totals[country_totals['ISO_Code'] != 'CHE']
+        country_totals['ISO_Code'] = iso_codes
+        # Drop Switzerland from the dataframe
+        country_totals = country_totals[country_totals['ISO_Code'] != 'CHE']
 
 
 
-    # Generate a custom continuous color scale by interpolating between the base color and white
-    color_scale = ['#FAFAFA',primaryColor]
+        # Generate a custom continuous color scale by interpolating between the base color and white
+        color_scale = ['#FAFAFA',primaryColor]
 
-    fig = go.Figure(data=go.Choropleth(
-        locations=country_totals['ISO_Code'],
-        z=country_totals[selected_indicator_Ankünfte_Logiernächte_3].astype(float),
-        colorscale=color_scale ,
-        text=country_totals['Herkunftsland'], # hover text
-        marker_line_color='white'# line markers between states
-    ))
+        fig = go.Figure(data=go.Choropleth(
+            locations=country_totals['ISO_Code'],
+            z=country_totals[selected_indicator_Ankünfte_Logiernächte_3].astype(float),
+            colorscale=color_scale ,
+            text=country_totals['Herkunftsland'], # hover text
+            marker_line_color='white'# line markers between states
+        ))
 
 
-    # Update the map layout
-    fig.update_geos(
-        showcountries=False,
-        showcoastlines=False,
-        showland=True,
-        showframe=False,
-        scope='world',
-        landcolor='#FAFAFA'  # Set the land color to light gray
-        )
-    # Display the map
-    #st.plotly_chart(fig,use_container_width = True)
+        # Update the map layout
+        fig.update_geos(
+            showcountries=False,
+            showcoastlines=False,
+            showland=True,
+            showframe=False,
+            scope='world',
+            landcolor='#FAFAFA'  # Set the land color to light gray
+            )
+        # Display the map
+        #st.plotly_chart(fig,use_container_width = True)
 
-    #st.caption(f"Abbildung 5: {selected_indicator_Ankünfte_Logiernächte} nach Herkunftsland von {earliest_year} - {most_recent_year} (International)")
+        #st.caption(f"Abbildung 5: {selected_indicator_Ankünfte_Logiernächte} nach Herkunftsland von {earliest_year} - {most_recent_year} (International)")
 
 
 
 
-    # Herkunftsland Dataframee
-    grouped_df_Herkunftsland = df.groupby(['Date','Monat','Jahr','Herkunftsland']).agg({selected_indicator_Ankünfte_Logiernächte_3: 'sum'}).reset_index()
-    grouped_df_Herkunftsland = grouped_df_Herkunftsland.groupby('Herkunftsland').agg({selected_indicator_Ankünfte_Logiernächte_3: list}).reset_index()
-    grouped_df_Herkunftsland[f"{selected_indicator_Ankünfte_Logiernächte_3} Total"] = grouped_df_Herkunftsland[selected_indicator_Ankünfte_Logiernächte_3].apply(lambda x: sum(x))
-    grouped_df_Herkunftsland[f"{selected_indicator_Ankünfte_Logiernächte_3} Anteil"] = ((100 / sum(grouped_df_Herkunftsland[f"{selected_indicator_Ankünfte_Logiernächte_3} Total"])) * grouped_df_Herkunftsland[f"{selected_indicator_Ankünfte_Logiernächte_3} Total"]).apply(lambda x: f"{x:.2f}%")
-    grouped_df_Herkunftsland.insert(0, "Flagge", grouped_df_Herkunftsland['Herkunftsland'].map(countryflags))
-    grouped_df_Herkunftsland = grouped_df_Herkunftsland.sort_values(f"{selected_indicator_Ankünfte_Logiernächte_3} Total",ascending=False)
+        # Herkunftsland Dataframee
+        grouped_df_Herkunftsland = rollup("kanton", "Herkunftsland")[['Herkunftsland', selected_indicator_Ankünfte_Logiernächte_3, f"{selected_indicator_Ankünfte_Logiernächte_3} Total", f"{selected_indicator_Ankünfte_Logiernächte_3} Anteil"]]
+        grouped_df_Herkunftsland = grouped_df_Herkunftsland.sort_values(f"{selected_indicator_Ankünfte_Logiernächte_3} Total",ascending=False)
+        grouped_df_Herkunftsland.insert(0, "Flagge", grouped_df_Herkunftsland['Herkunftsland'].map(countryflags))
 
     
-    st.dataframe(
-        grouped_df_Herkunftsland,
-        column_config={
-            "Flagge": st.column_config.ImageColumn("Flagge"),
-            "Herkunftsland": "Herkunftsland",
-            selected_indicator_Ankünfte_Logiernächte_3: st.column_config.LineChartColumn(
-                selected_indicator_Ankünfte_Logiernächte_3),
-            f"{selected_indicator_Ankünfte_Logiernächte_3} Anteil":st.column_config.ProgressColumn(
-        f"{selected_indicator_Ankünfte_Logiernächte_3} Anteil",
-            help="% zum Gesamtmarkt",
-            min_value=0,
-            max_value=1,
-        ),
-
-        },
-        hide_index=True,
-        use_container_width = True
-    )
-    st.caption(f"Abbildung 5: {selected_indicator_Ankünfte_Logiernächte} nach Herkunftsland von {earliest_year} - {most_recent_year}")
+        st.dataframe(
+            grouped_df_Herkunftsland,
+            column_config={
+                "Flagge": st.column_config.ImageColumn("Flagge"),
+                "Herkunftsland": "Herkunftsland",
+                selected_indicator_Ankünfte_Logiernächte_3: st.column_config.LineChartColumn(
+                    selected_indicator_Ankünfte_Logiernächte_3),
+                f"{selected_indicator_Ankünfte_Logiernächte_3} Anteil":st.column_config.ProgressColumn(
+            f"{selected_indicator_Ankünfte_Logiernächte_3} Anteil",
+                help="% zum Gesamtmarkt",
+                format="%.2f%%",
+                min_value=0,
+                max_value=100,
+            ),
+
+            },
+            hide_index=True,
+            use_container_width = True
+        )
+        st.caption(f"Abbildung 5: {selected_indicator_Ankünfte_Logiernächte_3} nach Herkunftsland von {earliest_year} - {most_recent_year}")
+    origin_table()
 
     st.divider()
     st.caption("with :heart: by Datachalet")
@@ -1506,7 +2884,7 @@ def create_about_page():
 
 
 #### Globale Datumsvariablen und Update BFS Logik 8 tag im Monat ###########
-# Calculate the cutoff date (last day of the month before the previous month
+# The publication cutoff (last day of the month before the previous month) is the fallback of the slider, see default_period
 current_date = datetime.date.today()
 
 
@@ -1515,19 +2893,8 @@ current_date = datetime.date.today()
 ##else:
 ##cutoff_date = datetime.date(current_date.year, current_date.month - 2, calendar.monthrange(current_date.year, current_date.month - 2)[1])
 
-if current_date.month > 3:
-    cutoff_date = datetime.date(current_date.year, current_date.month - 3, calendar.monthrange(current_date.year, current_date.month - 3)[1])
-else:
-    cutoff_date = datetime.date(current_date.year - 1, 12 - (3 - current_date.month), calendar.monthrange(current_date.year - 1, 12 - (3 - current_date.month))[1])
-
-
-# Define the date range for the slider
-start_date = datetime.date(2018, 1, 1)
-end_date = cutoff_date
-first_day_actual_month = cutoff_date.replace(day=1)
-
-start_year = start_date.year
-end_year = end_date.year
+# Define the date range for the slider, up to the latest month of the loaded datasets
+start_year, end_year = default_period([dataset_meta(name) for name, df in frames.items() if df is not None], current_date)
 
 ###############################################
 
@@ -1549,7 +2916,10 @@ st.sidebar.divider()
 
 #### Auswahl Gemeinde Global
 if page == "Nach Gemeinde" or page == "Nach Gemeinde und Herkunftsland" or page == "Hotels":
-    selected_Gemeinde = st.sidebar.selectbox('Auswahl Gemeinde', df_supply['Gemeinde'].unique(), index=0)
+    gemeinden_dataset = "supply" if df_supply is not None else "country"
+    if frames[gemeinden_dataset] is None:
+        st.stop()
+    selected_Gemeinde = st.sidebar.selectbox('Auswahl Gemeinde', dataset_meta(gemeinden_dataset).members['Gemeinde'], index=0)
 
 
 ##### Auswahl Zeithorizont und filterung DFs
@@ -1563,27 +2933,7 @@ selected_years = st.sidebar.slider(
 start_year = selected_years[0]
 end_year = selected_years[1]
 
-# Get the start_date and end_date based on the selection
-start_date = datetime.date(start_year, 1, 1)
-end_date = datetime.date(end_year, 12, 31)
-
-# Apply date filter to df Country
-df_country = df_country[(df_country['Jahr'] >= start_year) & (df_country['Jahr'] <= end_year)]
-first_day_actual_month = df_country['Date'].max()
-if end_date > first_day_actual_month:
-    end_date = first_day_actual_month
-
-# Apply date filter to df Supply 
-df_supply = df_supply[(df_supply['Jahr'] >= start_year) & (df_supply['Jahr'] <= end_year)]
-first_day_actual_month = df_supply['Date'].max()
-if end_date > first_day_actual_month:
-    end_date = first_day_actual_month
-
-# Apply date filter to df Supply 
-df_kanton = df_kanton[(df_kanton['Jahr'] >= start_year) & (df_kanton['Jahr'] <= end_year)]
-first_day_actual_month = df_kanton['Date'].max()
-if end_date > first_day_actual_month:
-    end_date = first_day_actual_month
+# The pages read the selected years from the cubes and row ranges, the frames are not filtered
 
 
 #### Einstellungen
@@ -1627,13 +2977,36 @@ st.sidebar.caption("with :heart: by Datachalet")
 
 #### Page Selection
 
+# A page only needs its own datasets, the others may still be loading or broken
+PAGE_DATASETS = {
+    "Gesamtmarkt Schweiz": ["kanton", "supply"],
+    "Nach Gemeinde": ["supply"],
+    "Nach Gemeinde und Herkunftsland": ["country"],
+    "About": [],
+}
+if any(frames[name] is None for name in PAGE_DATASETS[page]):
+    st.stop()
+
+# The frames handed to the pages are shared, see freeze_frame
+shared_frames = {name: frame_fingerprint(df) for name, df in [("country", df_country), ("supply", df_supply), ("kanton", df_kanton)] if df is not None}
+
 if page == "Nach Gemeinde":
     create_main_page(df_supply,selected_Gemeinde)
 elif page == "Nach Gemeinde und Herkunftsland":
     create_other_page(df_country,selected_Gemeinde)
 elif page == "Gesamtmarkt Schweiz":
-    create_markt_page(df_kanton,df_supply)
+    create_markt_page()
 # elif page == "Hotels":
 #     create_hotels_page(df_hotels,selected_Gemeinde)
 elif page == "About":
     create_about_page()
+
+modified = [name for name, df in [("country", df_country), ("supply", df_supply), ("kanton", df_kanton)]
+            if df is not None and frame_modified(df, shared_frames[name])]
+if modified:
+    # drop everything derived from them so no other session sees the damage
+    logger.error("Page %s modified the shared frames %s", page, modified)
+    for name in modified:
+        dataset_store().discard(name)
+    aggregate_cache().clear()
+    raise RuntimeError(f"Shared frames modified by page {page}: {modified}")
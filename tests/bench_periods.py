@@ -0,0 +1,76 @@
+# Latency of the period queries over every Zeitraum range of 2013 - 2026: the Herkunftsland totals and the
+# KPIs from the prefix sums of the cubes against the groupby on the rows of the period the pages ran before.
+# Synthetic frames of about the size of the BFS cubes, --small for a quick run.
+#   python tests/bench_periods.py [--small]
+import sys
+import time
+import types
+from pathlib import Path
+
+import numpy as np
+
+from bfs_fixture import frame
+
+APP_PATH = Path(__file__).resolve().parent.parent / "app.py"
+SUPPLY = ("Ankünfte", "Logiernächte", "Zimmernächte", "Betriebe", "Zimmer", "Zimmerauslastung in %")
+
+# The definitions of app.py without rendering a page, as the tests load them
+def load_app() -> types.ModuleType:
+    source = APP_PATH.read_text(encoding="utf-8")
+    module = types.ModuleType("app")
+    module.__file__ = str(APP_PATH)
+    sys.modules["app"] = module
+    exec(compile(source[:source.index("\n# Load data\n")], str(APP_PATH), "exec"), module.__dict__)
+    return module
+
+def timed(run) -> float:
+    started = time.perf_counter()
+    run()
+    return (time.perf_counter() - started) * 1000
+
+def main() -> None:
+    app = load_app()
+    small = "--small" in sys.argv
+    years = tuple(range(2013, 2027))
+    gemeinden = [f"Gemeinde {i}" for i in range(10 if small else 100)]
+    origins = ["Schweiz"] + [f"Land {i}" for i in range(10 if small else 70)]
+    kantone = [app.NATIONAL] + [f"Kanton {i}" for i in range(26)]
+    frames = {
+        "country": frame("Gemeinde", gemeinden, origins, years=years),
+        "supply": frame("Gemeinde", gemeinden, indicators=SUPPLY, years=years),
+        "kanton": frame("Kanton", kantone, [app.ALL_ORIGINS] + origins, years=years),
+    }
+    started = time.perf_counter()
+    cubes = {name: app.build_cube(df, app.CUBE_AXES[name]) for name, df in frames.items()}
+    print(f"{sum(len(df) for df in frames.values()):,} rows, cubes built in {time.perf_counter() - started:.1f}s")
+
+    def cube_totals(period):
+        cubes["country"].between(*period).agg(["Gemeinde", "Herkunftsland"], app.INDICATORS)
+        cubes["kanton"].between(*period).agg(["Kanton", "Herkunftsland"], app.INDICATORS)
+
+    def cube_kpis(period):
+        for name in ("supply", "kanton"):
+            app.build_kpis(cubes[name], name, period)
+
+    def groupby_totals(period):
+        for name, keys in [("country", ["Gemeinde", "Herkunftsland"]), ("kanton", ["Kanton", "Herkunftsland"])]:
+            df = frames[name]
+            df[df["Jahr"].between(*period)].groupby(keys, observed=True)[app.INDICATORS].sum()
+
+    # totals and means only, the latest month and the year to date come on top of it
+    def groupby_kpis(period):
+        df = frames["supply"]
+        df[df["Jahr"].between(*period)].groupby("Gemeinde", observed=True)[list(SUPPLY)].agg(["sum", "mean"])
+        df = frames["kanton"]
+        df = df[df["Jahr"].between(*period) & (df["Herkunftsland"] == app.ALL_ORIGINS).to_numpy()]
+        df.groupby("Kanton", observed=True)[app.INDICATORS].agg(["sum", "mean"])
+
+    periods = [(start, end) for start in years for end in years if start <= end]
+    for label, run in [("Herkunftsland totals, cube", cube_totals), ("Herkunftsland totals, groupby", groupby_totals),
+                       ("KPIs, cube", cube_kpis), ("KPI totals and means, groupby", groupby_kpis)]:
+        times = np.array([timed(lambda: run(period)) for period in periods])
+        print(f"{label}: {len(periods)} ranges, median {np.median(times):.1f} ms, p95 {np.percentile(times, 95):.1f} ms, "
+              f"max {times.max():.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# Local stand-in for the BFS download server and the PX files it serves
+import email.utils
+import hashlib
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+MONTHS = ["Januar", "Februar", "März", "April", "Mai", "Juni", "Juli", "August", "September", "Oktober", "November", "Dezember"]
+
+# Supply-like cube Jahr x Monat x Gemeinde x Indikator with the Jahrestotal of every year. shift changes
+# every cell so a new publication gives new bytes, the last year is published up to month published
+# ("..." after it) and revised adds to the arrivals of single (Jahr, Monat, Gemeinde) cells.
+def px_file(years=("2024", "2025"), gemeinden=("Zermatt", "Davos"), shift=0, published=12, revised=None) -> bytes:
+    revised = revised or {}
+    lines = [
+        'CHARSET="ANSI";',
+        'MATRIX="px-x-1003020000_201";',
+        'STUB="Jahr","Monat","Gemeinde";',
+        'HEADING="Indikator";',
+        'VALUES("Jahr")=' + ",".join(f'"{year}"' for year in years) + ';',
+        'VALUES("Monat")=' + ",".join(f'"{month}"' for month in ["Jahrestotal"] + MONTHS) + ';',
+        'VALUES("Gemeinde")=' + ",".join(f'"{gemeinde}"' for gemeinde in gemeinden) + ';',
+        'VALUES("Indikator")="Ankünfte","Logiernächte";',
+        'DATA=',
+    ]
+    for y, year in enumerate(years):
+        months = 12 if y < len(years) - 1 else published
+        for month in ["Jahrestotal"] + MONTHS:
+            for g, gemeinde in enumerate(gemeinden):
+                cells = [100 * (int(year) - 2023) + 10 * g + m + shift + revised.get((year, MONTHS[m - 1], gemeinde), 0)
+                         for m in range(1, months + 1)]
+                if month == "Jahrestotal":
+                    lines.append(f"{sum(cells)} {2 * sum(cells)}")
+                elif MONTHS.index(month) < months:
+                    arrivals = cells[MONTHS.index(month)]
+                    lines.append(f"{arrivals} {2 * arrivals}")
+                else:
+                    lines.append('"..." "..."')
+    lines[-1] += ";"
+    return "\n".join(lines).encode("iso-8859-2")
+
+# Frame as the pipeline leaves it: one row per Date and members of region (and origins), about 15% of
+# the rows missing and 5% of the values NaN, members as categoricals in the order given
+def frame(region: str, members, origins=None, indicators=("Ankünfte", "Logiernächte"), years=(2023, 2024, 2025),
+          seed=0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dims = {"Date": pd.date_range(f"{years[0]}-01-01", f"{years[-1]}-12-01", freq="MS"), region: members}
+    if origins is not None:
+        dims["Herkunftsland"] = origins
+    df = pd.MultiIndex.from_product(list(dims.values()), names=list(dims)).to_frame(index=False)
+    df = df[rng.random(len(df)) > 0.15].reset_index(drop=True)
+    for column, categories in list(dims.items())[1:]:
+        df[column] = pd.Categorical(df[column], categories=list(categories))
+    df.insert(0, "Jahr", df["Date"].dt.year)
+    df.insert(1, "Monat", pd.Categorical.from_codes(df["Date"].dt.month - 1, categories=MONTHS, ordered=True))
+    for indicator in indicators:
+        values = rng.integers(0, 1000, len(df)).astype(float)
+        values[rng.random(len(df)) < 0.05] = np.nan
+        df[indicator] = values
+    return df
+
+# Serves files by their ?file= name with ETag and Last-Modified and answers matching validators
+# with 304. Can be told to fail: statuses are answered to the next requests, delay stalls before
+# the headers, trickle spreads the body over that many seconds, ignore_validators always sends 200.
+class BfsFixture:
+    def __init__(self):
+        self.files = {}
+        self.statuses = []
+        self.delay = 0.0
+        self.trickle = 0.0
+        self.ignore_validators = False
+        self.requests = []  # (monotonic time, status, request headers)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def url(self, name: str) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/DownloadFile.aspx?file={name}"
+
+    def publish(self, name: str, raw: bytes) -> None:
+        self.files[name] = (raw, f'"{hashlib.md5(raw).hexdigest()}"', email.utils.formatdate(time.time(), usegmt=True))
+
+    def statuses_sent(self) -> list[int]:
+        return [status for _, status, _ in self.requests]
+
+    def handler(self):
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                name = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query).get("file", [""])[0]
+                status = fixture.statuses.pop(0) if fixture.statuses else 200
+                if status == 200 and name not in fixture.files:
+                    status = 404
+                raw, etag, last_modified = fixture.files.get(name, (b"", None, None))
+                if status == 200 and not fixture.ignore_validators and self.headers.get("If-None-Match") == etag:
+                    status = 304
+                fixture.requests.append((time.monotonic(), status, dict(self.headers)))
+                time.sleep(fixture.delay)
+
+                self.send_response(status)
+                if status not in (200, 304):
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", last_modified)
+                if status == 304:
+                    self.end_headers()
+                    return
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                pieces = 10 if fixture.trickle else 1
+                step = -(-len(raw) // pieces)
+                for start in range(0, len(raw), step):
+                    self.wfile.write(raw[start:start + step])
+                    self.wfile.flush()
+                    time.sleep(fixture.trickle / pieces)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self) -> "BfsFixture":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,52 @@
+import datetime
+import sys
+import threading
+import types
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+
+from bfs_fixture import BfsFixture, px_file
+
+APP_PATH = Path(__file__).resolve().parent.parent / "app.py"
+
+# The definitions of app.py without rendering a page: everything before the data is loaded.
+# Outside of `streamlit run` st.cache_resource does not cache, so tests build their own sessions and stores.
+@pytest.fixture(scope="session")
+def app():
+    source = APP_PATH.read_text(encoding="utf-8")
+    module = types.ModuleType("app")
+    module.__file__ = str(APP_PATH)
+    sys.modules["app"] = module
+    exec(compile(source[:source.index("\n# Load data\n")], str(APP_PATH), "exec"), module.__dict__)
+    return module
+
+@pytest.fixture
+def bfs():
+    with BfsFixture() as fixture:
+        fixture.publish("supply", px_file())
+        yield fixture
+
+# Snapshots in a temporary directory, short network limits and a supply dataset served by bfs that
+# is due for revalidation as soon as it was fetched
+@pytest.fixture
+def dataset(app, bfs, tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "SNAPSHOT_DIR", tmp_path / "snapshot")
+    monkeypatch.setattr(app, "DOWNLOAD_BACKOFF", 0.1)
+    monkeypatch.setattr(app, "DOWNLOAD_READ_TIMEOUT", 1)
+    spec = replace(app.DATASETS["supply"], url=bfs.url("supply"), ttl=datetime.timedelta(0))
+    monkeypatch.setattr(app, "DATASETS", {"supply": spec})
+    return spec
+
+# A store for dataset, its background refreshes finish before bfs shuts down
+@pytest.fixture
+def store(app, bfs, dataset):
+    store = app.DatasetStore(app.http_session(), threading.Lock())
+    yield store
+    store.executor.shutdown(wait=True)
+
+# The dataset fetched once, its snapshot on disk
+@pytest.fixture
+def snapshot(app, dataset):
+    return app.load_snapshot("supply", dataset, app.http_session(), threading.Lock(), {})
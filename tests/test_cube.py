@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bfs_fixture import frame
+
+GEMEINDEN = ["Zermatt", "Davos", "Arosa", "Saas-Fee"]
+KANTONE = ["Schweiz", "Bern", "Graubünden", "Valais / Wallis"]
+ORIGINS = ["Schweiz", "Deutschland", "Frankreich", "Italien", "Vereinigte Staaten"]
+
+FRAMES = {
+    "supply": lambda: frame("Gemeinde", GEMEINDEN, indicators=("Ankünfte", "Logiernächte", "Betriebe", "Zimmerauslastung in %")),
+    "country": lambda: frame("Gemeinde", GEMEINDEN, ORIGINS),
+    "kanton": lambda: frame("Kanton", KANTONE, ORIGINS),
+}
+
+# Baseline: the groupby the pages ran before the cube, on members as strings as pyaxis read them,
+# sums as pandas adds up NaN, means over the values that are not NaN
+def groupby(df: pd.DataFrame, keep: list[str], measures: list[str], app) -> pd.DataFrame:
+    how = {measure: app.MEASURES[measure] for measure in measures}
+    return as_strings(df).groupby(keep).agg(how).reset_index()
+
+def as_strings(df: pd.DataFrame) -> pd.DataFrame:
+    return df.astype({column: object for column in df.select_dtypes("category").columns})
+
+# The cube keeps the category order, the baseline sorted the strings: rows are compared in key order
+def assert_same_table(table: pd.DataFrame, expected: pd.DataFrame, keys: list[str]):
+    sort = lambda df: as_strings(df).sort_values(keys).reset_index(drop=True)
+    pd.testing.assert_frame_equal(sort(table), sort(expected), check_dtype=False)
+
+def measures(df: pd.DataFrame, app) -> list[str]:
+    return [column for column in df.columns if column in app.MEASURES]
+
+@pytest.mark.parametrize("dataset", list(FRAMES))
+def test_agg_matches_groupby(app, dataset):
+    df = FRAMES[dataset]()
+    cube = app.build_cube(df, app.CUBE_AXES[dataset])
+    axes = list(app.CUBE_AXES[dataset])
+
+    for keep in [axes[:1], axes[1:2], axes[-1:], axes[1:], [axes[-1], "Date"], axes]:
+        assert_same_table(cube.agg(keep, measures(df, app)), groupby(df, keep, measures(df, app), app), keep)
+
+@pytest.mark.parametrize("dataset", list(FRAMES))
+def test_select_matches_filter(app, dataset):
+    df = FRAMES[dataset]()
+    region = app.CUBE_AXES[dataset][1]
+    cube = app.build_cube(df, app.CUBE_AXES[dataset])
+
+    for member in df[region].cat.categories:
+        rows = df[df[region] == member]
+        selected = cube.select(region, member)
+        for keep in [["Date"], selected.axes[-1:]]:
+            assert_same_table(selected.agg(keep, measures(df, app)), groupby(rows, keep, measures(df, app), app), keep)
+
+def test_ratio_from_aggregated_sums(app):
+    df = FRAMES["country"]()
+    cube = app.build_cube(df, app.CUBE_AXES["country"])
+
+    table = cube.agg(["Herkunftsland"], ["Aufenthaltsdauer"]).set_index("Herkunftsland")
+
+    sums = as_strings(df).groupby("Herkunftsland")[["Logiernächte", "Ankünfte"]].sum()
+    np.testing.assert_allclose(table["Aufenthaltsdauer"], (sums["Logiernächte"] / sums["Ankünfte"])[table.index])
+
+@pytest.mark.parametrize("dataset", ["country", "kanton"])
+def test_regroup_matches_grob_groupby(app, dataset):
+    df = FRAMES[dataset]()
+    region = app.CUBE_AXES[dataset][1]
+    cube = app.build_cube(df, app.CUBE_AXES[dataset])
+    grob = cube.regroup("Herkunftsland", app.domestic_international(cube.labels[2]), "Herkunftsland_grob")
+
+    # baseline: Herkunftsland_grob column on the rows, then summed per region, group and Date
+    df["Herkunftsland_grob"] = np.where(df["Herkunftsland"] == "Schweiz", "Domestic", "International")
+    for keep in [[region, "Herkunftsland_grob", "Date"], [region, "Herkunftsland_grob"], ["Herkunftsland_grob"]]:
+        assert_same_table(grob.agg(keep, app.INDICATORS), groupby(df, keep, app.INDICATORS, app), keep)
+
+def test_rows_must_be_unique(app):
+    df = FRAMES["supply"]()
+
+    with pytest.raises(ValueError):
+        app.build_cube(pd.concat([df, df.iloc[:1]], ignore_index=True), app.CUBE_AXES["supply"])
+
+@pytest.mark.parametrize("period", [(2023, 2025), (2024, 2024), (2025, 2026), (2020, 2023), (2026, 2027)])
+def test_between_matches_year_filter(app, period):
+    df = FRAMES["country"]()
+    cube = app.build_cube(df, app.CUBE_AXES["country"])
+    rows = df[df["Jahr"].between(*period)]
+
+    view = cube.between(*period)
+
+    assert list(view.labels[0]) == sorted(rows["Date"].unique())
+    for keep in [["Gemeinde"], ["Gemeinde", "Herkunftsland"], ["Herkunftsland", "Date"]]:
+        assert_same_table(view.agg(keep, app.INDICATORS), groupby(rows, keep, app.INDICATORS, app), keep)
+
+def test_window_sums_and_counts(app):
+    df = FRAMES["supply"]()
+    cube = app.build_cube(df, app.CUBE_AXES["supply"])
+    dates = cube.labels[0]
+
+    for start, stop in [(0, len(dates)), (3, 15), (12, 13), (20, 20)]:
+        sums, counts, rows = cube.window(start, stop)
+        in_window = df[df["Date"].isin(dates[start:stop])]
+        for g, gemeinde in enumerate(cube.labels[1]):
+            member_rows = in_window[in_window["Gemeinde"] == gemeinde]
+            assert rows[g] == len(member_rows)
+            for i, indicator in enumerate(cube.indicators):
+                assert counts[g, i] == member_rows[indicator].notna().sum()
+                np.testing.assert_allclose(sums[g, i], member_rows[indicator].sum())
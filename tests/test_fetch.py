@@ -0,0 +1,118 @@
+import threading
+
+import pytest
+import requests
+
+from bfs_fixture import px_file
+
+def load(app, spec, stage_cache=None):
+    return app.load_snapshot("supply", spec, app.http_session(), threading.Lock(), {} if stage_cache is None else stage_cache)
+
+def test_download_builds_frame_and_snapshot(app, bfs, dataset):
+    df, totals, _, changes = load(app, dataset)
+
+    assert bfs.statuses_sent() == [200]
+    assert "gzip" in bfs.requests[0][2]["Accept-Encoding"]
+    assert len(df) == 2 * 12 * 2 and df["Jahr"].dtype.kind == "i"
+    assert (totals["Monat"] == app.JAHRESTOTAL).all()
+    assert changes == {"full": True}
+    entry = app.read_manifest()["supply"]
+    assert entry["etag"] and entry["last_modified"]
+    assert app.read_snapshot("supply")[0].equals(df)
+
+def test_not_modified_reuses_snapshot(app, bfs, dataset):
+    df, _, fetched_at, _ = load(app, dataset)
+    etag = app.read_manifest()["supply"]["etag"]
+
+    again, _, refetched_at, changes = load(app, dataset)
+
+    assert bfs.statuses_sent() == [200, 304]
+    assert bfs.requests[1][2]["If-None-Match"] == etag
+    assert bfs.requests[1][2]["If-Modified-Since"]
+    assert changes is None and again.equals(df)
+    assert refetched_at > fetched_at
+    assert app.read_manifest()["supply"]["fetched_at"] == refetched_at.isoformat()
+
+def test_same_bytes_reuse_snapshot(app, bfs, dataset):
+    df, _, _, _ = load(app, dataset)
+    bfs.ignore_validators = True
+    stage_cache = {}
+
+    again, _, _, changes = load(app, dataset, stage_cache)
+
+    assert bfs.statuses_sent() == [200, 200]
+    assert changes is None and again.equals(df)
+    assert stage_cache == {}  # not parsed again
+
+def test_new_publication_is_processed(app, bfs, dataset):
+    load(app, dataset)
+    bfs.publish("supply", px_file(shift=1))
+
+    df, _, _, changes = load(app, dataset)
+
+    assert bfs.statuses_sent() == [200, 200]
+    assert changes is not None
+    assert df["Ankünfte"].min() == 102
+
+def test_retries_with_backoff(app, bfs, dataset):
+    bfs.statuses = [503, 502]
+
+    df, _, _, _ = load(app, dataset)
+
+    assert bfs.statuses_sent() == [503, 502, 200]
+    assert len(df) == 48
+    # urllib3 retries the first failure right away and doubles DOWNLOAD_BACKOFF after that
+    assert bfs.requests[2][0] - bfs.requests[1][0] >= 2 * app.DOWNLOAD_BACKOFF
+
+def test_retries_give_up(app, bfs, dataset):
+    bfs.statuses = [503] * (app.DOWNLOAD_RETRIES + 1)
+
+    with pytest.raises(requests.RequestException):
+        load(app, dataset)
+    assert len(bfs.requests) == app.DOWNLOAD_RETRIES + 1
+    assert app.read_snapshot("supply") is None
+
+def test_stalled_server_times_out(app, bfs, dataset, monkeypatch):
+    monkeypatch.setattr(app, "DOWNLOAD_READ_TIMEOUT", 0.2)
+    monkeypatch.setattr(app, "DOWNLOAD_RETRIES", 0)
+    bfs.delay = 1
+
+    with pytest.raises(requests.RequestException):
+        load(app, dataset)
+
+def test_slow_download_hits_deadline(app, bfs, dataset, monkeypatch):
+    monkeypatch.setattr(app, "DOWNLOAD_TIMEOUT", 0.3)
+    bfs.trickle = 0.6
+
+    with pytest.raises(TimeoutError):
+        load(app, dataset)
+
+def test_failed_refresh_serves_last_snapshot(app, bfs, snapshot, store):
+    df, _, _, _ = snapshot
+    bfs.statuses = [500] * (app.DOWNLOAD_RETRIES + 1)
+
+    # the expired snapshot is served right away while the refresh runs in the background
+    frames, _, _, _ = store.frames(timeout=10)
+    assert frames["supply"].equals(df)
+    store.states["supply"].future.result(timeout=10)
+
+    frames, _, revisions, errors = store.frames(timeout=10)
+    assert frames["supply"].equals(df) and revisions["supply"] == 1
+    assert "500" in errors["supply"]
+    assert store.states["supply"].expires is not None  # retried after REFRESH_RETRY
+
+def test_same_cells_in_new_bytes_skip_later_stages(app, bfs, dataset, monkeypatch):
+    df, _, _, _ = load(app, dataset)
+    sha256 = app.read_manifest()["supply"]["sha256"]
+    bfs.publish("supply", px_file().replace(b'CHARSET="ANSI";', b'CHARSET="ANSI";\nNOTE="neu exportiert";'))
+    ran = []
+    monkeypatch.setattr(app, "PIPELINE_STAGES", [
+        (stage_name, lambda spec, value, stage=stage, stage_name=stage_name: ran.append(stage_name) or stage(spec, value))
+        for stage_name, stage in app.PIPELINE_STAGES])
+
+    again, _, _, changes = load(app, dataset)
+
+    assert bfs.statuses_sent() == [200, 200]
+    assert ran == ["parse"]
+    assert changes is None and again.equals(df)
+    assert app.read_manifest()["supply"]["sha256"] != sha256
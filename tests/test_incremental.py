@@ -0,0 +1,88 @@
+import threading
+
+import pandas as pd
+
+from bfs_fixture import MONTHS, px_file
+
+def load(app, spec):
+    return app.load_snapshot("supply", spec, app.http_session(), threading.Lock(), {})
+
+# The frame a first download of the current publication builds, in a snapshot directory of its own
+def rebuilt(app, spec, tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "SNAPSHOT_DIR", tmp_path / "rebuilt")
+    return load(app, spec)[0]
+
+def assert_same_frame(app, df, expected):
+    as_object = {column: object for column in expected.select_dtypes("category").columns}
+    pd.testing.assert_frame_equal(app.sort_rows(df).astype(as_object), app.sort_rows(expected).astype(as_object))
+
+def test_slice_hashes_follow_cells_and_members(app):
+    cube, _ = app.split_totals(app.DATASETS["supply"], app.read_px(px_file()))
+    revised, _ = app.split_totals(app.DATASETS["supply"], app.read_px(px_file(revised={("2025", "Mai", "Davos"): 5})))
+    wider, _ = app.split_totals(app.DATASETS["supply"], app.read_px(px_file(gemeinden=("Zermatt", "Davos", "Arosa"))))
+
+    hashes = app.slice_hashes(cube)
+
+    assert len(hashes) == 24 and "2025/Mai" in hashes
+    assert [key for key, digest in app.slice_hashes(revised).items() if hashes[key] != digest] == ["2025/Mai"]
+    assert all(hashes[key] != digest for key, digest in app.slice_hashes(wider).items())
+
+def test_revised_month(app, bfs, dataset, tmp_path, monkeypatch):
+    load(app, dataset)
+    bfs.publish("supply", px_file(revised={("2025", "Mai", "Davos"): 5}))
+
+    df, _, _, changes = load(app, dataset)
+
+    assert changes == {"slices": ["2025/Mai"], "Gemeinde": ["Davos"], "Kanton": ["Graubünden / Grigioni / Grischun"]}
+    assert app.read_manifest()["supply"]["refresh"] == "incremental"
+    assert_same_frame(app, df, rebuilt(app, dataset, tmp_path, monkeypatch))
+
+def test_appended_month(app, bfs, dataset, tmp_path, monkeypatch):
+    load(app, dataset)
+    bfs.publish("supply", px_file(years=("2024", "2025", "2026"), published=2))
+    load(app, dataset)
+    bfs.publish("supply", px_file(years=("2024", "2025", "2026"), published=3))
+
+    df, _, _, changes = load(app, dataset)
+
+    assert changes["slices"] == ["2026/März"] and changes["Gemeinde"] == ["Davos", "Zermatt"]
+    assert len(df[df["Jahr"] == 2026]) == 3 * 2
+    assert_same_frame(app, df, rebuilt(app, dataset, tmp_path, monkeypatch))
+
+def test_removed_slices(app, bfs, dataset, tmp_path, monkeypatch):
+    load(app, dataset)
+    bfs.publish("supply", px_file(years=("2025",)))
+
+    df, _, _, changes = load(app, dataset)
+
+    assert sorted(changes["slices"]) == sorted(f"2024/{month}" for month in MONTHS)
+    assert changes["Gemeinde"] == ["Davos", "Zermatt"]
+    assert set(df["Jahr"]) == {2025}
+    assert_same_frame(app, df, rebuilt(app, dataset, tmp_path, monkeypatch))
+
+def test_new_gemeinde_forces_full_refresh(app, bfs, dataset, tmp_path, monkeypatch):
+    # the new member changes all 36 slices, more than INCREMENTAL_MAX_SLICES
+    years = ("2023", "2024", "2025")
+    bfs.publish("supply", px_file(years=years))
+    load(app, dataset)
+    bfs.publish("supply", px_file(years=years, gemeinden=("Zermatt", "Davos", "Arosa")))
+
+    df, _, _, changes = load(app, dataset)
+
+    assert changes == {"full": True}
+    assert app.read_manifest()["supply"]["refresh"] == "full"
+    assert set(df["Gemeinde"]) == {"Zermatt", "Davos", "Arosa"}
+    assert_same_frame(app, df, rebuilt(app, dataset, tmp_path, monkeypatch))
+
+def test_member_revisions(app, bfs, dataset, store):
+    _, _, revisions, _ = store.frames(timeout=10)
+    assert revisions["supply"] == 1
+    bfs.publish("supply", px_file(revised={("2025", "Mai", "Davos"): 5}))
+
+    store.refresh("supply")
+
+    assert store.states["supply"].revision == 2
+    assert store.member_revision("supply", 2, "Davos") == 2
+    assert store.member_revision("supply", 2, "Zermatt") == 1
+    # a session still on the old frame keys by its own revision
+    assert store.member_revision("supply", 1, "Zermatt") == 1
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bfs_fixture import frame
+
+GEMEINDEN = ["Zermatt", "Davos", "Arosa"]
+SUPPLY = ("Ankünfte", "Logiernächte", "Zimmernächte", "Betriebe", "Zimmer", "Zimmerauslastung in %")
+PERIODS = [(2023, 2025), (2024, 2024), (2025, 2025), (2024, 2026)]
+
+def change(current: float, previous: float) -> float:
+    return round((current - previous) / previous * 100, 1)
+
+# Baseline: the metrics create_main_page computed from the rows of one region in the selected years,
+# the months one year earlier from all its rows
+def baseline_kpis(rows: pd.DataFrame, period: tuple[int, int], latest: pd.Timestamp, indicator: str) -> dict:
+    selected = rows[rows["Jahr"].between(*period)]
+    month = rows[rows["Date"] == latest][indicator].mean()
+    month_last_year = rows[rows["Date"] == latest - pd.DateOffset(years=1)][indicator].mean()
+    ytd = rows[(rows["Date"] >= pd.Timestamp(latest.year, 1, 1)) & (rows["Date"] <= latest)][indicator].sum()
+    ytd_last_year = rows[(rows["Date"] >= pd.Timestamp(latest.year - 1, 1, 1)) & (rows["Date"] <= latest - pd.DateOffset(years=1))][indicator].sum()
+    return {
+        "total": selected[indicator].sum(),
+        "mean": selected[indicator].mean(),
+        "month": month,
+        "month_last_year": month_last_year,
+        "ytd": ytd,
+        "ytd_last_year": ytd_last_year,
+        "month_diff": month - month_last_year,
+        "month_change": change(month, month_last_year),
+        "ytd_change": change(ytd, ytd_last_year),
+    }
+
+def assert_same_kpis(kpis: pd.DataFrame, rows_of, regions, indicators, period, latest):
+    for region in regions:
+        for indicator in indicators:
+            expected = baseline_kpis(rows_of(region), period, latest, indicator)
+            actual = kpis.loc[(region, indicator)]
+            for metric, value in expected.items():
+                np.testing.assert_allclose(actual[metric], value, rtol=1e-9, err_msg=f"{region} {indicator} {metric}")
+
+@pytest.mark.parametrize("period", PERIODS)
+def test_supply_kpis_match_baseline(app, period):
+    df = frame("Gemeinde", GEMEINDEN, indicators=SUPPLY)
+    cube = app.build_cube(df, app.CUBE_AXES["supply"])
+
+    kpis = app.build_kpis(cube, "supply", period)
+
+    latest = df.loc[df["Jahr"] <= period[1], "Date"].max()
+    assert kpis.attrs["month"] == latest
+    assert kpis.attrs["first"] == df.loc[df["Jahr"] >= period[0], "Date"].min()
+    assert_same_kpis(kpis, lambda gemeinde: df[df["Gemeinde"] == gemeinde], GEMEINDEN, SUPPLY, period, latest)
+
+@pytest.mark.parametrize("period", PERIODS)
+def test_kanton_kpis_match_baseline(app, period):
+    kantone = [app.NATIONAL, "Bern", "Graubünden"]
+    df = frame("Kanton", kantone, [app.ALL_ORIGINS, "Schweiz", "Deutschland"])
+    cube = app.build_cube(df, app.CUBE_AXES["kanton"])
+
+    kpis = app.build_kpis(cube, "kanton", period)
+
+    # the all-origins rows of every Kanton, the Kanton Schweiz for the national page
+    latest = df.loc[df["Jahr"] <= period[1], "Date"].max()
+    rows_of = lambda kanton: df[(df["Kanton"] == kanton) & (df["Herkunftsland"] == app.ALL_ORIGINS)]
+    assert kpis.attrs["month"] == latest
+    assert_same_kpis(kpis, rows_of, kantone, app.INDICATORS, period, latest)
+
+@pytest.mark.parametrize("period", [(2013, 2014), (2025, 2026)])
+def test_period_without_months(app, period):
+    # a cube of 2016 - 2024 and a Zeitraum before or after it: no month to headline
+    df = frame("Gemeinde", GEMEINDEN, indicators=SUPPLY, years=(2016, 2024))
+    cube = app.build_cube(df, app.CUBE_AXES["supply"])
+
+    kpis = app.build_kpis(cube, "supply", period)
+
+    assert kpis.attrs["month"] is None and kpis.attrs["first"] is None
+    assert list(kpis.columns) == app.KPI_METRICS and len(kpis) == len(GEMEINDEN) * len(SUPPLY)
+    assert kpis.isna().all().all()
@@ -0,0 +1,105 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+from pyaxis import pyaxis
+
+from bfs_fixture import px_file
+
+# Cells of a PX file as the baseline read them: pyaxis, then the values coerced to numbers
+def pyaxis_cells(path) -> tuple[dict[str, list[str]], np.ndarray]:
+    parsed = pyaxis.parse(uri=str(path), encoding="ISO-8859-2")
+    dims = parsed["METADATA"]["STUB"] + parsed["METADATA"]["HEADING"]
+    values = {dim: parsed["METADATA"][f"VALUES({dim})"] for dim in dims}
+    return values, pd.to_numeric(parsed["DATA"]["DATA"], errors="coerce").to_numpy(dtype=np.float64)
+
+def assert_same_as_pyaxis(app, raw: bytes, tmp_path):
+    path = tmp_path / "cube.px"
+    path.write_bytes(raw)
+    values, cells = pyaxis_cells(path)
+
+    cube = app.read_px(raw)
+
+    assert dict(zip(cube.dims, cube.values)) == values
+    np.testing.assert_array_equal(cube.data.ravel(), cells)
+    return cube
+
+def px(metadata: list[str], data: str, newline="\n") -> bytes:
+    return newline.join(metadata + ["DATA=", data + ";"]).encode("iso-8859-2")
+
+METADATA = [
+    'CHARSET="ANSI";',
+    'STUB="Jahr","Gemeinde";',
+    'HEADING="Indikator";',
+    'VALUES("Jahr")="2024","2025";',
+    'VALUES("Gemeinde")="Zürich","Neuchâtel","Saas-Fee";',
+    'VALUES("Indikator")="Ankünfte","Logiernächte";',
+]
+
+def test_fixture_file(app, tmp_path):
+    assert_same_as_pyaxis(app, px_file(), tmp_path)
+
+def test_values_split_across_lines(app, tmp_path, monkeypatch):
+    # 12 cells wrapped at arbitrary points, tabs and CRLF line ends, chunks cut inside the numbers
+    monkeypatch.setattr(app, "PX_CHUNK_SIZE", 5)
+    raw = px(METADATA, "1 22\r\n333\t4444 5\r\n\r\n66 7\r\n8 9 10\t11\r\n12", newline="\r\n")
+
+    cube = assert_same_as_pyaxis(app, raw, tmp_path)
+
+    assert cube.data.shape == (2, 3, 2)
+    assert cube.data[1, 2, 1] == 12
+
+def test_missing_value_markers(app, tmp_path):
+    raw = px(METADATA, '1 "..." 3 "-" "." 6\n".." 8 "..." 10 11 "-"')
+
+    cube = assert_same_as_pyaxis(app, raw, tmp_path)
+
+    assert np.isnan(cube.data).sum() == 6
+
+def test_multi_line_values(app, tmp_path):
+    metadata = [
+        'CHARSET="ANSI";',
+        'STUB="Jahr",\n"Gemeinde";',
+        'HEADING="Indikator";',
+        'VALUES("Jahr")="2023",\n"2024", "2025";',
+        'VALUES("Gemeinde")= "Zürich" ,\n  "Neuchâtel",\n"Saas-Fee" ;',
+        'VALUES("Indikator")="Ankünfte",\n"Logiernächte";',
+        'NOTE="Daten; Stand: 2025";',
+    ]
+    data = " ".join(str(cell) for cell in range(18))
+
+    cube = assert_same_as_pyaxis(app, px(metadata, data), tmp_path)
+
+    assert cube.values[1] == ["Zürich", "Neuchâtel", "Saas-Fee"]
+
+def test_member_split_into_strings(app):
+    # a long member is written as adjacent strings, it stays one member
+    metadata = METADATA[:4] + ['VALUES("Gemeinde")="Zürich","Wildhaus-"\n"Alt St. Johann","Saas-Fee";'] + METADATA[5:]
+
+    cube = app.read_px(px(metadata, " ".join(["1"] * 12)))
+
+    assert cube.values[1] == ["Zürich", "Wildhaus-Alt St. Johann", "Saas-Fee"]
+
+@pytest.mark.parametrize("cells", [11, 13])
+def test_cell_count_must_match(app, cells):
+    with pytest.raises(ValueError):
+        app.read_px(px(METADATA, " ".join(["1"] * cells)))
+
+def test_frame_matches_pyaxis_pivot(app, tmp_path):
+    raw = px_file()
+    path = tmp_path / "cube.px"
+    path.write_bytes(raw)
+
+    # baseline: pyaxis long table pivoted on Indikator
+    baseline = pyaxis.parse(uri=str(path), encoding="ISO-8859-2")["DATA"]
+    baseline = baseline.pivot(index=["Jahr", "Monat", "Gemeinde"], columns="Indikator", values="DATA").reset_index()
+    baseline[["Ankünfte", "Logiernächte"]] = baseline[["Ankünfte", "Logiernächte"]].apply(pd.to_numeric, errors="coerce")
+
+    frame = app.cube_to_frame(app.read_px(raw), "Indikator").astype({"Monat": object, "Gemeinde": object})
+
+    keys = ["Jahr", "Monat", "Gemeinde"]
+    merged = baseline.merge(frame, on=keys, suffixes=("", "_px"), validate="one_to_one")
+    assert len(merged) == len(baseline) == len(frame) == len(list(itertools.product(["2024", "2025"], range(13), range(2))))
+    for column in ["Ankünfte", "Logiernächte"]:
+        np.testing.assert_array_equal(merged[column].to_numpy(dtype=np.float64), merged[f"{column}_px"].to_numpy())
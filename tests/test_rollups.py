@@ -0,0 +1,74 @@
+import pandas as pd
+import pytest
+
+from bfs_fixture import frame
+
+GEMEINDEN = ["Zermatt", "Davos", "Arosa"]
+PERIOD = (2024, 2025)
+
+def origins(count: int) -> list[str]:
+    return ["Schweiz", "Österreich", "Deutschland"] + [f"Land {i:02d}" for i in range(count - 3)]
+
+def as_strings(df: pd.DataFrame) -> pd.DataFrame:
+    return df.astype({column: object for column in df.select_dtypes("category").columns})
+
+# Baseline: create_other_page ranked the Herkunftsländer of the Gemeinde by their total, kept the 15
+# largest and grouped the rest as Others
+def baseline_top(rows: pd.DataFrame, indicator: str, app) -> tuple[list[str], pd.DataFrame, pd.DataFrame]:
+    grouped_df = as_strings(rows).groupby(['Herkunftsland', 'Date'])[app.INDICATORS].sum().reset_index()
+    sorted_values = grouped_df.groupby('Herkunftsland').sum(numeric_only=True).sort_values(indicator, ascending=False).index.tolist()
+    grouped_df['Herkunftsland_grouped'] = grouped_df['Herkunftsland'].apply(lambda x: x if x in sorted_values[:app.TOP_ORIGINS] else app.OTHERS)
+    grouped_df_no_date = grouped_df.groupby('Herkunftsland_grouped')[app.INDICATORS].sum().reset_index()
+    grouped_df_date = grouped_df.groupby(['Herkunftsland_grouped', 'Date'])[app.INDICATORS].sum().reset_index()
+    return sorted_values, grouped_df_no_date, grouped_df_date
+
+@pytest.mark.parametrize("count", [25, 10])
+def test_top_origins_match_baseline(app, count):
+    df = frame("Gemeinde", GEMEINDEN, origins(count))
+    ranking = app.build_ranking(app.build_cube(df, app.CUBE_AXES["country"]).between(*PERIOD))
+    rows = df[df["Jahr"].between(*PERIOD)]
+
+    for gemeinde in GEMEINDEN:
+        for indicator in app.INDICATORS:
+            sorted_values, no_date, date = baseline_top(rows[rows["Gemeinde"] == gemeinde], indicator, app)
+
+            top_no_date, top_date = ranking.top(gemeinde, indicator, app.TOP_ORIGINS)
+
+            assert ranking.ranked(gemeinde, indicator) == sorted_values
+            assert (app.OTHERS in top_no_date['Herkunftsland_grouped'].tolist()) == (count > app.TOP_ORIGINS)
+            pd.testing.assert_frame_equal(top_no_date, no_date, check_dtype=False)
+            pd.testing.assert_frame_equal(top_date, date, check_dtype=False)
+
+# Baseline: the sparkline tables of the pages, the monthly sums of every member as a list, their total
+# and its share of the total of all members
+def baseline_series(rows: pd.DataFrame, column: str, indicator: str) -> pd.DataFrame:
+    grouped = as_strings(rows).groupby(['Date', 'Monat', 'Jahr', column]).agg({indicator: 'sum'}).reset_index()
+    grouped = grouped.groupby(column).agg({indicator: list}).reset_index()
+    grouped[f"{indicator} Total"] = grouped[indicator].apply(lambda x: sum(x))
+    grouped[f"{indicator} Anteil"] = (100 / sum(grouped[f"{indicator} Total"])) * grouped[f"{indicator} Total"]
+    return grouped
+
+def assert_same_series(table: pd.DataFrame, expected: pd.DataFrame, column: str, indicator: str):
+    table = as_strings(table).sort_values(column).reset_index(drop=True)
+    assert table[column].tolist() == expected[column].tolist()
+    assert table[indicator].tolist() == expected[indicator].tolist()
+    for suffix in (" Total", " Anteil"):
+        pd.testing.assert_series_equal(table[indicator + suffix], expected[indicator + suffix], check_dtype=False)
+
+def test_gemeinde_series_match_baseline(app):
+    df = frame("Gemeinde", GEMEINDEN + ["Saas-Fee", "Ascona"])
+    table = app.supply_rollups(app.build_cube(df, app.CUBE_AXES["supply"]).between(*PERIOD))["Gemeinde"]
+
+    for indicator in app.INDICATORS:
+        assert_same_series(table, baseline_series(df[df["Jahr"].between(*PERIOD)], "Gemeinde", indicator), "Gemeinde", indicator)
+
+def test_herkunftsland_series_match_baseline(app):
+    df = frame("Gemeinde", GEMEINDEN, origins(25))
+    table = app.country_rollups(app.build_cube(df, app.CUBE_AXES["country"]).between(*PERIOD))["Herkunftsland"]
+    rows = df[df["Jahr"].between(*PERIOD)]
+
+    # one table per Gemeinde, the shares are of the total of the Gemeinde
+    for gemeinde in GEMEINDEN:
+        for indicator in app.INDICATORS:
+            expected = baseline_series(rows[rows["Gemeinde"] == gemeinde], "Herkunftsland", indicator)
+            assert_same_series(table[table["Gemeinde"] == gemeinde].drop(columns="Gemeinde"), expected, "Herkunftsland", indicator)
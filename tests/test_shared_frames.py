@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+# The frame of the store as the pages get it
+@pytest.fixture
+def shared(snapshot, store):
+    frames, _, _, _ = store.frames(timeout=10)
+    return frames["supply"]
+
+def test_reading_is_not_a_modification(app, shared):
+    fingerprint = app.frame_fingerprint(shared)
+    shared[shared["Gemeinde"] == "Zermatt"]["Logiernächte"].sum()
+    shared.iloc[:10].copy()["Logiernächte"] = 0.0
+
+    assert not app.frame_modified(shared, fingerprint)
+
+def test_writing_into_a_column_raises(app, shared):
+    with pytest.raises(ValueError):
+        shared["Logiernächte"].to_numpy()[0] = 0.0
+    with pytest.raises(ValueError):
+        shared.loc[0, "Logiernächte"] = 0.0
+
+def test_replaced_column_is_caught(app, shared):
+    fingerprint = app.frame_fingerprint(shared)
+    shared["Logiernächte"] = 0.0
+
+    assert app.frame_modified(shared, fingerprint)
+
+def test_replaced_column_of_same_values_is_caught(app, shared):
+    fingerprint = app.frame_fingerprint(shared)
+    shared["Ankünfte"] = np.array(shared["Ankünfte"])
+
+    assert app.frame_modified(shared, fingerprint)
+
+@pytest.mark.parametrize("modify", [
+    lambda df: df.insert(0, "Extra", 1),
+    lambda df: df.drop(columns="Ankünfte", inplace=True),
+    lambda df: df.rename(columns={"Ankünfte": "Arrivals"}, inplace=True),
+    lambda df: df.reset_index(drop=True, inplace=True),
+])
+def test_structural_changes_are_caught(app, shared, modify):
+    fingerprint = app.frame_fingerprint(shared)
+    modify(shared)
+
+    assert app.frame_modified(shared, fingerprint)
@@ -0,0 +1,63 @@
+import datetime
+import threading
+from dataclasses import replace
+
+def test_snapshot_read_outside_lock(app, snapshot, store, monkeypatch):
+    read_snapshot = app.read_snapshot
+    locked = []
+
+    def observed_read(name):
+        locked.append(store.lock.locked())
+        return read_snapshot(name)
+
+    monkeypatch.setattr(app, "read_snapshot", observed_read)
+    frames, _, revisions, _ = store.frames(timeout=10)
+
+    assert locked == [False]
+    assert frames["supply"] is not None and revisions["supply"] == 1
+
+def test_snapshot_installed_once(app, snapshot, store, monkeypatch):
+    read_snapshot = app.read_snapshot
+    reading = threading.Barrier(2)
+
+    # two sessions read the snapshot at the same time, only the first installs it
+    def concurrent_read(name):
+        snapshot = read_snapshot(name)
+        reading.wait(timeout=10)
+        return snapshot
+
+    monkeypatch.setattr(app, "read_snapshot", concurrent_read)
+    results = []
+    sessions = [threading.Thread(target=lambda: results.append(store.frames(timeout=10))) for _ in range(2)]
+    for session in sessions:
+        session.start()
+    for session in sessions:
+        session.join()
+
+    first, second = (frames["supply"] for frames, _, _, _ in results)
+    assert first is second
+    assert store.states["supply"].revision == 1
+
+def test_discarded_frame_reloads_from_snapshot(app, snapshot, store):
+    frames, _, _, _ = store.frames(timeout=10)
+    frames["supply"]["Logiernächte"] = 0.0
+    store.discard("supply")
+
+    frames, _, revisions, errors = store.frames(timeout=10)
+
+    assert frames["supply"]["Logiernächte"].min() > 0
+    assert revisions["supply"] == 2 and not errors
+
+def test_discarded_frame_without_snapshot_refreshes(app, bfs, dataset, store, monkeypatch):
+    monkeypatch.setitem(app.DATASETS, "supply", replace(dataset, ttl=datetime.timedelta(days=1)))
+    frames, _, _, _ = store.frames(timeout=10)
+    assert store.states["supply"].expires > datetime.datetime.now(datetime.timezone.utc)
+    for path in app.snapshot_paths("supply"):
+        path.unlink()
+    store.discard("supply")
+
+    frames, _, revisions, errors = store.frames(timeout=10)
+
+    assert frames["supply"] is not None
+    assert revisions["supply"] == 2 and not errors
+    assert bfs.statuses_sent() == [200, 200]